@@ -4,10 +4,10 @@ from datetime import timedelta
 
 import voluptuous as vol
 
-# from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-
 from homeassistant.config_entries import ConfigEntry, SOURCE_IMPORT
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
+import homeassistant.helpers.config_validation as cv
 
 from homeassistant.helpers import device_registry as dr
 
@@ -19,13 +19,52 @@ from .const import (
     DEFAULT_HAL_NAME,
     CONF_HAL_SELECT_INTERVAL,
     DEFAULT_SELECT_INTERVAL,
+    CONF_HAL_ADAPTIVE_INTERVAL,
+    DEFAULT_ADAPTIVE_INTERVAL,
+    CONF_HAL_SELECT_INTERVAL_MIN,
+    DEFAULT_SELECT_INTERVAL_MIN,
+    CONF_HAL_SELECT_INTERVAL_MAX,
+    DEFAULT_SELECT_INTERVAL_MAX,
+    CONF_HAL_LEGACY_PROTOCOL,
+    DEFAULT_LEGACY_PROTOCOL,
+    CONF_HAL_PUSH,
+    DEFAULT_PUSH,
+    CONF_ZONES,
     HAL_OBJECT,
     HAL_COORDINATOR,
+    HAL_SCHEDULER,
+    HAL_SNAPSHOTS,
+    HAL_SOURCE_MAP,
+    HAL_SUPERVISOR,
     HAL_VERSION,
+    HAL_ZONES,
+    HAL_ATTR_POWER,
+    HAL_ATTR_SOURCE,
+    HAL_ATTR_VOLUME,
+    HAL_ATTR_MUTE,
+    HAL_ATTR_ENABLED,
+    HAL_ATTR_DURATION,
+    HAL_ATTR_CURVE,
+    HAL_RAMP_MAX_DURATION,
+    HAL_ATTR_SNAPSHOT,
+    HAL_ATTR_PERSIST,
+    DEFAULT_SNAPSHOT,
     HAL_SCAN_INTERVAL,
-    HAL_CONNECT_RETRY_INTERVAL,
+    HAL_SHUTDOWN_TIMEOUT,
     SERVICE_TURN_OFF,
     SERVICE_SET_SELECT_INTERVAL,
+    SERVICE_SET_ZONES,
+    SERVICE_SET_FRAME_TRACE,
+    SERVICE_RAMP_VOLUME,
+    SERVICE_SNAPSHOT,
+    SERVICE_RESTORE,
+    SIGNAL_HAL_OPTIONS_UPDATED,
+)
+from .ramp import RAMP_CURVES, RAMP_LINEAR
+
+ZONE_LIST_SCHEMA = vol.All(
+    cv.ensure_list,
+    [vol.All(vol.Coerce(int), vol.Range(min=1, max=HAL_ZONES))],
 )
 
 SERVICE_TURN_OFF_SCHEMA = vol.Schema(
@@ -41,67 +80,113 @@ SERVICE_SET_SELECT_INTERVAL_SCHEMA = vol.Schema(
     }
 )
 
-PLATFORMS = ["media_player"]
+SERVICE_SET_ZONES_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required(CONF_HAL_NAME, default=DEFAULT_HAL_NAME): str,
+            vol.Required(CONF_ZONES): ZONE_LIST_SCHEMA,
+            vol.Optional(HAL_ATTR_POWER): cv.boolean,
+            vol.Optional(HAL_ATTR_SOURCE): cv.string,
+            vol.Optional(HAL_ATTR_VOLUME): vol.All(
+                vol.Coerce(float), vol.Range(min=0, max=1)
+            ),
+            vol.Optional(HAL_ATTR_MUTE): cv.boolean,
+        }
+    ),
+    cv.has_at_least_one_key(
+        HAL_ATTR_POWER, HAL_ATTR_SOURCE, HAL_ATTR_VOLUME, HAL_ATTR_MUTE
+    ),
+)
+
+SERVICE_SET_FRAME_TRACE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_HAL_NAME, default=DEFAULT_HAL_NAME): str,
+        vol.Optional(HAL_ATTR_ENABLED, default=True): cv.boolean,
+    }
+)
+
+SERVICE_RAMP_VOLUME_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_HAL_NAME, default=DEFAULT_HAL_NAME): str,
+        vol.Required(CONF_ZONES): ZONE_LIST_SCHEMA,
+        vol.Required(HAL_ATTR_VOLUME): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=1)
+        ),
+        vol.Required(HAL_ATTR_DURATION): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=HAL_RAMP_MAX_DURATION)
+        ),
+        vol.Optional(HAL_ATTR_CURVE, default=RAMP_LINEAR): vol.In(RAMP_CURVES),
+    }
+)
+
+SERVICE_SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_HAL_NAME, default=DEFAULT_HAL_NAME): str,
+        vol.Optional(HAL_ATTR_SNAPSHOT, default=DEFAULT_SNAPSHOT): cv.string,
+        vol.Optional(HAL_ATTR_PERSIST, default=False): cv.boolean,
+    }
+)
+
+SERVICE_RESTORE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_HAL_NAME, default=DEFAULT_HAL_NAME): str,
+        vol.Optional(HAL_ATTR_SNAPSHOT, default=DEFAULT_SNAPSHOT): cv.string,
+    }
+)
+
+PLATFORMS = ["media_player", "sensor"]
 
 from homeassistant.components.media_player import PLATFORM_SCHEMA, MediaPlayerEntity
 from homeassistant.const import (
     CONF_HOST,
     CONF_NAME,
     CONF_PORT,
+    CONF_SCAN_INTERVAL,
     EVENT_HOMEASSISTANT_STOP,
 )
 from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 
-from halca1006 import HALProtocol
 import logging
 
+from .client import create_client
+from .coordinator import HALDataUpdateCoordinator
+from .models import SourceMap
+from .runtime import async_get_runtime
+from .scheduler import HALCommandScheduler
+from .store import HALSnapshots, HALStateStore
+from .supervisor import HALConnectionSupervisor
+
 _LOGGER = logging.getLogger(__name__)
-hal_collect = {}
 
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the HAL CA1006 multi-zone amplifier component."""
-    _LOGGER.debug(f"hal.__init__.async_setup():hass ={hass}, config = {config}")
-    hass.data.setdefault(DOMAIN, {})
+    async_get_runtime(hass)
     conf = config.get(DOMAIN)
-    _LOGGER.debug(f"hal.__init__.async_setup():config.get({DOMAIN}) = {conf}")
 
     # Setup services
-    _LOGGER.debug(f"async_setp: Setting up services.")
-
-    _LOGGER.debug(f"Defining turn_off service")
-
     async def turn_off(service):
         """Turn off all zones."""
         hal_name = service.data[CONF_HAL_NAME]
-        _LOGGER.debug(f"turn_off: Turning off HAL unit {hal_name} from {hal_collect}.")
-        await hass.async_add_executor_job(hal_collect[hal_name].turn_off)
+        _LOGGER.debug("turn_off: Turning off HAL unit %s.", hal_name)
+        await _unit(hass, hal_name)[HAL_SCHEDULER].async_turn_off()
 
-    _LOGGER.debug(
-        f"async_setp: Registering service {SERVICE_TURN_OFF} for domain {DOMAIN} "
-        f"with schema {SERVICE_TURN_OFF_SCHEMA}."
-    )
     hass.services.async_register(
         DOMAIN, SERVICE_TURN_OFF, turn_off, schema=SERVICE_TURN_OFF_SCHEMA
     )
 
-    _LOGGER.debug(f"Defining set_select_interval service")
-
     async def set_select_interval(service):
-        """Turn off all zones."""
+        """Set the select interval, or its fallback if the interval is adaptive."""
         hal_name = service.data[CONF_HAL_NAME]
         select_interval = service.data[CONF_HAL_SELECT_INTERVAL]
         _LOGGER.debug(
-            f"turn_off: Setting select interval on HAL unit {hal_name} to {select_interval}."
-        )
-        await hass.async_add_executor_job(
-            hal_collect[hal_name].set_select_interval, select_interval
+            "set_select_interval: Setting select interval on HAL unit %s to %s.",
+            hal_name,
+            select_interval,
         )
+        _unit(hass, hal_name)[HAL_OBJECT].set_select_interval(select_interval)
 
-    _LOGGER.debug(
-        f"async_setp: Registering service {SERVICE_SET_SELECT_INTERVAL} for domain {DOMAIN} "
-        f"with schema {SERVICE_SET_SELECT_INTERVAL_SCHEMA}."
-    )
     hass.services.async_register(
         DOMAIN,
         SERVICE_SET_SELECT_INTERVAL,
@@ -109,6 +194,113 @@ async def async_setup(hass: HomeAssistant, config: dict):
         schema=SERVICE_SET_SELECT_INTERVAL_SCHEMA,
     )
 
+    async def set_zones(service):
+        """Set power, source, volume and mute of several zones as one batch."""
+        hal_name = service.data[CONF_HAL_NAME]
+        unit = _unit(hass, hal_name)
+        source = service.data.get(HAL_ATTR_SOURCE)
+        if source is not None:
+            source_id = unit[HAL_SOURCE_MAP].lookup(source)
+            if source_id is None:
+                raise HomeAssistantError(f"Unknown source {source}")
+            source = source_id
+        await unit[HAL_COORDINATOR].async_set_zones(
+            [str(zone) for zone in service.data[CONF_ZONES]],
+            power=service.data.get(HAL_ATTR_POWER),
+            source=source,
+            volume=service.data.get(HAL_ATTR_VOLUME),
+            muted=service.data.get(HAL_ATTR_MUTE),
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_ZONES, set_zones, schema=SERVICE_SET_ZONES_SCHEMA
+    )
+
+    async def set_frame_trace(service):
+        """Switch the trace of the protocol frames of a HAL unit on or off."""
+        hal_name = service.data[CONF_HAL_NAME]
+        _unit(hass, hal_name)[HAL_OBJECT].trace.set_enabled(
+            service.data[HAL_ATTR_ENABLED]
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_FRAME_TRACE,
+        set_frame_trace,
+        schema=SERVICE_SET_FRAME_TRACE_SCHEMA,
+    )
+
+    async def ramp_volume(service):
+        """Ramp the volume of several zones to a target over a given time."""
+        hal_name = service.data[CONF_HAL_NAME]
+        unit = _unit(hass, hal_name)
+        coordinator = unit[HAL_COORDINATOR]
+        zones = []
+        for zone in service.data[CONF_ZONES]:
+            zone_id = str(zone)
+            if (coordinator.data or {}).get(zone_id) is None:
+                _LOGGER.warning(
+                    "%s: Zone %s is not available, skipping.", hal_name, zone_id
+                )
+                continue
+            zones.append(zone_id)
+        await asyncio.gather(
+            *(
+                unit[HAL_SCHEDULER].async_ramp_volume(
+                    zone_id,
+                    round(coordinator.data[zone_id].volume * 100),
+                    round(service.data[HAL_ATTR_VOLUME] * 100),
+                    service.data[HAL_ATTR_DURATION],
+                    service.data[HAL_ATTR_CURVE],
+                )
+                for zone_id in zones
+            )
+        )
+        coordinator.async_update_zone(*zones)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_RAMP_VOLUME, ramp_volume, schema=SERVICE_RAMP_VOLUME_SCHEMA
+    )
+
+    async def snapshot(service):
+        """Take a snapshot of the state of all zones of a HAL unit."""
+        hal_name = service.data[CONF_HAL_NAME]
+        unit = _unit(hass, hal_name)
+        _LOGGER.debug(
+            "snapshot: Taking snapshot %s of HAL unit %s.",
+            service.data[HAL_ATTR_SNAPSHOT],
+            hal_name,
+        )
+        await unit[HAL_SNAPSHOTS].async_take(
+            service.data[HAL_ATTR_SNAPSHOT],
+            unit[HAL_COORDINATOR].data or {},
+            service.data[HAL_ATTR_PERSIST],
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SNAPSHOT, snapshot, schema=SERVICE_SNAPSHOT_SCHEMA
+    )
+
+    async def restore(service):
+        """Restore the zones of a HAL unit to a snapshot."""
+        hal_name = service.data[CONF_HAL_NAME]
+        unit = _unit(hass, hal_name)
+        name = service.data[HAL_ATTR_SNAPSHOT]
+        saved = unit[HAL_SNAPSHOTS].get(name)
+        if saved is None:
+            raise HomeAssistantError(f"Unknown snapshot {name} of HAL unit {hal_name}")
+        changed = await unit[HAL_COORDINATOR].async_restore(saved)
+        _LOGGER.debug(
+            "restore: Restored snapshot %s of HAL unit %s, zones changed %s.",
+            name,
+            hal_name,
+            changed,
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_RESTORE, restore, schema=SERVICE_RESTORE_SCHEMA
+    )
+
     if not conf:
         return True
 
@@ -123,33 +315,113 @@ async def async_setup(hass: HomeAssistant, config: dict):
     return True
 
 
+def _unit(hass, hal_name):
+    """Return the runtime data of the loaded HAL unit called hal_name."""
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry.data[CONF_HAL_NAME] != hal_name:
+            continue
+        if entry.entry_id in hass.data[DOMAIN]:
+            return hass.data[DOMAIN][entry.entry_id]
+    raise HomeAssistantError(f"Unknown HAL unit {hal_name}")
+
+
+def entry_config(entry):
+    """Return the configuration of an entry, with its options applied."""
+    return {**entry.data, **entry.options}
+
+
+def valid_zones(config):
+    """Return the ids (as strings) of the zones that have speakers attached."""
+    return [str(i) for i in range(1, HAL_ZONES + 1) if config[f"zone_{i}_valid"]]
+
+
+def configure_client(hal, config):
+    """Apply the select interval options to a HAL client."""
+    hal.set_select_interval(config[CONF_HAL_SELECT_INTERVAL])
+    if config.get(CONF_HAL_ADAPTIVE_INTERVAL, DEFAULT_ADAPTIVE_INTERVAL):
+        hal.set_adaptive_interval(
+            config.get(CONF_HAL_SELECT_INTERVAL_MIN, DEFAULT_SELECT_INTERVAL_MIN),
+            config.get(CONF_HAL_SELECT_INTERVAL_MAX, DEFAULT_SELECT_INTERVAL_MAX),
+        )
+    else:
+        hal.disable_adaptive_interval()
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up HAL CA1006 multi-zone amplifier from a config entry."""
-    _LOGGER.debug(f"hal.__init__.async_setup_entry():hass ={hass}, entry = {entry}")
     _LOGGER.debug(
-        f"entry.domain {entry.domain}, "
-        f"entry.title {entry.title}, "
-        f"entry.version {entry.version}, "
-        f"entry.data {entry.data}, "
-        f"entry.source {entry.source}, "
-        f"entry.options {entry.options}, "
-        f"entry.unique_id {entry.unique_id}, "
-        f"entry.entry_id {entry.entry_id}, "
-        f"entry.state {entry.state}."
+        "async_setup_entry: Setting up %s (entry %s, source %s).",
+        entry.title,
+        entry.entry_id,
+        entry.source,
+    )
+    runtime = async_get_runtime(hass)
+    config = entry_config(entry)
+    legacy = entry.data.get(CONF_HAL_LEGACY_PROTOCOL, DEFAULT_LEGACY_PROTOCOL)
+    # A unit that has just been added reuses the connection of the config flow
+    hal = runtime.async_take_probe(entry.data[CONF_HOST], entry.data[CONF_PORT], legacy)
+    if hal is None:
+        hal = create_client(
+            hass,
+            entry.data[CONF_HOST],
+            entry.data[CONF_PORT],
+            name=entry.data[CONF_HAL_NAME],
+            legacy=legacy,
+        )
+    configure_client(hal, config)
+
+    async def async_connect():
+        """Connect to the HAL, unless the client is connected already."""
+        if hal.is_connected():
+            return True
+        async with runtime.connect_slots:
+            return await hal.async_connect()
+
+    # We need to centralize connection/disconnection logic since we have more than
+    # one platform. If the HAL is unreachable, Home Assistant retries the setup in
+    # the background with an increasing, jittered delay. The saved zone state and
+    # snapshots are loaded while connecting.
+    store = HALStateStore(hass, entry.entry_id)
+    snapshots = HALSnapshots(hass, entry.entry_id)
+    connected, restored, _ = await asyncio.gather(
+        async_connect(), store.async_load(valid_zones(config)), snapshots.async_load()
     )
+    if not connected:
+        await hal.async_disconnect()
+        raise ConfigEntryNotReady(
+            f"Unable to connect to HAL at {entry.data[CONF_HOST]}:{entry.data[CONF_PORT]}"
+        )
 
-    _LOGGER.debug(
-        f"async_setup_entry:Adding HALProtocol API to hass.data[{DOMAIN}][{entry.entry_id}]"
+    # The legacy protocol driver cannot receive frames pushed by the HAL
+    push = entry.data.get(CONF_HAL_PUSH, DEFAULT_PUSH) and not legacy
+    scheduler = HALCommandScheduler(
+        hal, entry.data[CONF_HAL_NAME], io_slots=runtime.io_slots
     )
-    hal = hal_collect[entry.data[CONF_HAL_NAME]] = HALProtocol(
-        entry.data[CONF_HOST],
-        entry.data[CONF_PORT],
-        name=entry.data[CONF_HAL_NAME],
+    coordinator = HALDataUpdateCoordinator(
+        hass,
+        hal,
+        scheduler,
+        entry.data[CONF_HAL_NAME],
+        valid_zones(config),
+        push=push,
+        scan_interval=config.get(CONF_SCAN_INTERVAL, HAL_SCAN_INTERVAL),
     )
-    hass.data[DOMAIN][entry.entry_id] = hal
-    _LOGGER.debug(
-        f"async_setup_entry:hass.data[{DOMAIN}][entry.entry_id] = {hass.data[DOMAIN][entry.entry_id]}"
+    supervisor = HALConnectionSupervisor(
+        hass,
+        hal,
+        scheduler,
+        coordinator,
+        entry.data[CONF_HAL_NAME],
+        runtime.connect_slots,
     )
+    hass.data[DOMAIN][entry.entry_id] = {
+        HAL_OBJECT: hal,
+        HAL_SCHEDULER: scheduler,
+        HAL_COORDINATOR: coordinator,
+        HAL_SUPERVISOR: supervisor,
+        HAL_SOURCE_MAP: SourceMap.from_config(config),
+        HAL_SNAPSHOTS: snapshots,
+    }
 
     # Manually register a device for the overall HAL unit
     device_registry = dr.async_get(hass)
@@ -161,43 +433,90 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         model=MODEL,
         sw_version=entry.data["sw_version"],
     )
-    # We need to centralize connection/disconnection logic since we have more than one platform
-    while not await hass.async_add_executor_job(hal.connect):
-        _LOGGER.warning(
-            f"Unable to connect to HAL at {entry.data[CONF_PORT]}:{entry.data[CONF_PORT]}. "
-            f"Retry in {HAL_CONNECT_RETRY_INTERVAL} seconds"
-        )
-        asyncio.sleep(HAL_CONNECT_RETRY_INTERVAL)
 
-    await hass.async_add_executor_job(hal.enable_logger)
-    await hass.async_add_executor_job(
-        hal.set_select_interval, entry.data[CONF_HAL_SELECT_INTERVAL]
+    # The entities show the zone state saved before a restart straight away,
+    # and the first poll reads the zones again in the background. Without a
+    # saved state, all zones are polled once before the entities are added.
+    if restored:
+        coordinator.data = restored
+    else:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except ConfigEntryNotReady:
+            await _async_shutdown_unit(hass, hass.data[DOMAIN].pop(entry.entry_id))
+            raise
+
+    @callback
+    def async_save_state():
+        """Save the zone state whenever it changes."""
+        store.async_save(coordinator.data)
+
+    entry.async_on_unload(coordinator.async_add_listener(async_save_state))
+    async_save_state()
+
+    # From here on, dropped connections are re-established in the background,
+    # and the unit is polled in its own slot of the shared poll schedule
+    supervisor.async_start(entry)
+    runtime.async_add_unit(coordinator, poll_now=bool(restored))
+    entry.async_on_unload(entry.add_update_listener(_async_update_options))
+
+    async def async_on_stop(event):
+        """Shut the unit down cleanly when Home Assistant stops."""
+        await _async_shutdown_unit(hass, hass.data[DOMAIN][entry.entry_id])
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_on_stop)
     )
 
-    _LOGGER.debug(
-        f"hal.__init__.async_setup_entry: Setting up entry {entry} for platforms {PLATFORMS}."
-    )
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
     return True
 
 
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Unload a config entry."""
+async def _async_update_options(hass: HomeAssistant, entry: ConfigEntry):
+    """Apply changed options to a running HAL unit, keeping its connection."""
+    unit = hass.data[DOMAIN][entry.entry_id]
+    config = entry_config(entry)
+    configure_client(unit[HAL_OBJECT], config)
+    unit[HAL_SOURCE_MAP] = SourceMap.from_config(config)
+    coordinator = unit[HAL_COORDINATOR]
+    coordinator.scan_interval = config.get(CONF_SCAN_INTERVAL, HAL_SCAN_INTERVAL)
+    # The platforms add, remove and update their entities first, so that the
+    # zones read below are published to the right entities
+    async_dispatcher_send(hass, SIGNAL_HAL_OPTIONS_UPDATED.format(entry.entry_id))
+    await coordinator.async_set_zone_list(valid_zones(config))
 
-    # Disconnect from HAL gracefully before unloading
-    hal = hass.data[DOMAIN][entry.entry_id]
-    _LOGGER.debug(
-        f"async_unload_entry: Disconnecting from HAL {entry.data[CONF_HAL_NAME]}"
-        f" with handle {hal}."
-    )
-    await hass.async_add_executor_job(hal.disconnect)
 
-    _LOGGER.debug(f"async_unload_entry: hass {hass}, entry {entry}.")
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
-
-    _LOGGER.debug(f"async_unload_entry: unload_ok {unload_ok}.")
+    _LOGGER.debug("async_unload_entry: unload_ok %s.", unload_ok)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        await _async_shutdown_unit(hass, hass.data[DOMAIN].pop(entry.entry_id))
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Delete the saved zone state and snapshots of a removed config entry."""
+    await HALStateStore(hass, entry.entry_id).async_remove()
+    await HALSnapshots(hass, entry.entry_id).async_remove()
+
+
+async def _async_shutdown_unit(hass: HomeAssistant, unit):
+    """Stop all activity of a HAL unit and close its connection.
+
+    Polls are cancelled, including one in progress, and commands that are
+    still queued are given HAL_SHUTDOWN_TIMEOUT seconds to be sent before they
+    are dropped. Closing the connection is bounded too, so this never waits
+    for long on a HAL that is slow or gone. Shutting a unit down twice is
+    harmless.
+    """
+    coordinator = unit[HAL_COORDINATOR]
+    async_get_runtime(hass).async_remove_unit(coordinator)
+    await coordinator.async_shutdown()
+    coordinator.async_stop_push()
+    await unit[HAL_SUPERVISOR].async_stop()
+    await unit[HAL_SCHEDULER].async_shutdown(HAL_SHUTDOWN_TIMEOUT)
+    _LOGGER.debug("%s: Disconnecting.", coordinator.name)
+    await unit[HAL_OBJECT].async_disconnect()
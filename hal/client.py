@@ -0,0 +1,667 @@
+"""Clients for talking to a HAL CA1006 multi-zone amplifier.
+
+HALClient speaks the CA1006 protocol natively on asyncio streams so that no
+executor thread is held while waiting for the amplifier to answer.
+HALExecutorClient wraps the blocking halca1006.HALProtocol behind the same
+coroutine API and is kept as a fallback transport.
+
+Both clients cache the last known state of each zone in the same raw string
+form as HALProtocol, and expose it through the synchronous get_* methods.
+HALClient additionally keeps its cache current from the zone status frames
+the HAL pushes on the stream, and notifies registered listeners of changes.
+"""
+import asyncio
+import logging
+import re
+
+from halca1006 import HALProtocol
+
+from .const import (
+    DEFAULT_SELECT_INTERVAL,
+    DEFAULT_SELECT_INTERVAL_MAX,
+    DEFAULT_SELECT_INTERVAL_MIN,
+    HAL_CLOSE_TIMEOUT,
+    HAL_CONNECT_TIMEOUT,
+    HAL_ZONES,
+)
+from .stats import HALStats
+from .trace import FrameTrace
+
+_LOGGER = logging.getLogger(__name__)
+
+# HAL CA1006 protocol commands
+ECHO_OFF = b"E0"
+SET_NODE_MUTE = b"MU "  # <ADDR> <MUTE>
+SET_NODE_POWER = b"PW "  # <ADDR> <STATE>
+SET_NODE_SOURCE = b"SS "  # <ADDR> <SRC>
+SET_NODE_STATUS = b"SE "  # <ADDR> <STATE> <SRC> <VOL> <MUTE>
+GET_RA_STATUS = b"SR "  # <ADDR>
+SET_SYSTEM_PWR_SAVE = b"TO"
+SET_NODE_VOL_ABS = b"VA "  # <ADDR> <VOL>
+GET_VERSION = b"VE"
+
+# Signatures of the successful responses to the above commands
+HAL_SUCCESS_MSG = {
+    SET_NODE_MUTE: b"MUTE SEND COMPLETE",
+    SET_NODE_POWER: b"POWER STATE SEND COMPLETE",
+    SET_NODE_SOURCE: b"SOURCE SEND COMPLETE",
+    SET_NODE_STATUS: b"SE ",
+    GET_RA_STATUS: b"Status Source Volume Video Mute  !!!!!RA Status!!!!!   \n\r",
+    SET_SYSTEM_PWR_SAVE: b"SYSTEM POWERSAVE EXECUTED",
+    SET_NODE_VOL_ABS: b"VOLUME SEND COMPLETE",
+    GET_VERSION: b"AM6 VERSION ",
+}
+
+HAL_EOL = b"\r"
+HAL_MSG_INTERVAL = 0.1  # Seconds to wait between commands to the HAL
+HAL_MAX_VOL = 32
+HAL_RA_STATUS_SIZE = 14  # Bytes of zone status following the RA status header
+HAL_SE_STATUS_SIZE = 13  # Bytes of zone status following SE in a status frame
+HAL_UNKNOWN = "UNKNOWN"
+HAL_MAX_FRAME_SIZE = 256  # Bytes of an unterminated line kept while waiting for EOL
+
+# Response time estimator, as used for TCP retransmission timeouts (RFC 6298)
+HAL_RTT_ALPHA = 0.125  # Weight of a new sample in the smoothed response time
+HAL_RTT_BETA = 0.25  # Weight of a new sample in the response time deviation
+HAL_RTT_K = 4  # Deviations added to the smoothed response time
+
+# Zone status frame: SE <ZONE> <POWER> <SOURCE> <VOLUME> <MUTE>
+HAL_STATUS_FRAME = re.compile(rb"^SE\s+(\d)\s+(\d\d)\s+(\d\d)\s+(\d{1,2})\s+(\d\d)")
+
+
+def quantize_volume(volume):
+    """Return the volume [0..100] the HAL reports after being set to volume.
+
+    The HAL only has HAL_MAX_VOL volume steps.
+    """
+    return ((int(volume) * HAL_MAX_VOL) // 100 * 100) // HAL_MAX_VOL
+
+
+def volume_step(volume):
+    """Return the HAL volume step of a volume [0..100] reported by the HAL."""
+    return -(-int(volume) * HAL_MAX_VOL // 100)
+
+
+def step_volume(step):
+    """Return the volume [0..100] to send to set the HAL to a volume step.
+
+    A volume reported by the HAL is rounded down to the step below if it is
+    sent back as it is; step_volume(volume_step(volume)) is not.
+    """
+    return -(-step * 100 // HAL_MAX_VOL)
+
+
+def create_client(hass, host, port, name="", legacy=False, stats=None):
+    """Return a client for the HAL unit at host:port.
+
+    The native asyncio client is used unless the legacy transport is requested.
+    stats is the HALStats instance the client counts its traffic in.
+    """
+    if legacy:
+        return HALExecutorClient(hass, host, port, name=name, stats=stats)
+    return HALClient(host, port, name=name, stats=stats)
+
+
+class HALClient:
+    """Asyncio-native HAL CA1006 protocol client."""
+
+    def __init__(self, host, port, name="", stats=None):
+        """Initialize the client."""
+        self._host = host
+        self._port = int(port)
+        self._name = name
+        self.stats = stats or HALStats()
+        self.trace = FrameTrace(name)
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._rx_buf = bytearray()
+        self._rx_event = asyncio.Event()
+        self._frame_buf = bytearray()
+        self._listeners = []
+        self._disconnect_listener = None
+        self._lock = asyncio.Lock()
+        self._last_tx_t = 0.0
+        self._select_interval = DEFAULT_SELECT_INTERVAL
+        self._configured_interval = DEFAULT_SELECT_INTERVAL
+        self._min_interval = DEFAULT_SELECT_INTERVAL_MIN
+        self._max_interval = DEFAULT_SELECT_INTERVAL_MAX
+        self._adaptive = False
+        self._srtt = None
+        self._rttvar = 0.0
+        self._version = HAL_UNKNOWN
+        self._power = {}
+        self._source = {}
+        self._volume = {}
+        self._mute = {}
+        for i in range(1, HAL_ZONES + 1):
+            self._power[i] = HAL_UNKNOWN
+            self._source[i] = HAL_UNKNOWN
+            self._volume[i] = HAL_UNKNOWN
+            self._mute[i] = HAL_UNKNOWN
+
+    def is_connected(self):
+        """Return True if the stream to the HAL is open."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    def register_listener(self, listener):
+        """Register a callback invoked with the zone number of every pushed update.
+
+        Returns a function that removes the listener again.
+        """
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def set_disconnect_listener(self, listener):
+        """Set a callback invoked when the HAL drops the connection."""
+        self._disconnect_listener = listener
+
+    async def async_connect(self):
+        """Connect to the HAL, turn off echo and read the firmware version."""
+        _LOGGER.debug("%s: Connecting to %s:%s.", self._name, self._host, self._port)
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port), HAL_CONNECT_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError) as err:
+            _LOGGER.debug(
+                "%s: Error connecting to %s:%s: %s",
+                self._name,
+                self._host,
+                self._port,
+                err,
+            )
+            self.stats.count("connect_failures")
+            return False
+
+        self.stats.count("connects")
+        if self._read_task is not None:
+            self._read_task.cancel()
+        self._frame_buf.clear()
+        self._read_task = asyncio.get_running_loop().create_task(
+            self._async_read_loop(self._reader)
+        )
+        # Echo off has no response worth waiting for, so the version request
+        # follows it straight away
+        await self._send(ECHO_OFF)
+        await self._get_version()
+        return self.is_connected()
+
+    async def async_disconnect(self):
+        """Close the connection to the HAL.
+
+        A HAL that does not let the connection close in time is cut off, so
+        that unloading never waits on a unit that is slow or gone.
+        """
+        task, self._read_task = self._read_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        writer = self._writer
+        self._close()
+        if writer is None:
+            return
+        try:
+            await asyncio.wait_for(writer.wait_closed(), HAL_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.debug("%s: Timeout closing the connection, aborting.", self._name)
+            writer.transport.abort()
+        except OSError:
+            pass
+
+    def _close(self):
+        """Close the stream and wake up any pending request."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._rx_event.set()
+
+    def _connection_lost(self):
+        """Close the stream after an error and tell the disconnect listener."""
+        self.stats.count("disconnects")
+        self._close()
+        if self._disconnect_listener is not None:
+            self._disconnect_listener()
+
+    async def _async_read_loop(self, reader):
+        """Consume everything the HAL sends for as long as the stream is open.
+
+        Bytes are collected for the request in flight, if any, and are also
+        scanned for zone status frames, which the HAL emits both in response
+        to commands and unsolicited when a zone is changed from a keypad.
+        """
+        try:
+            while True:
+                chunk = await reader.read(1024)
+                if not chunk:
+                    _LOGGER.warning("%s: Connection closed by the HAL.", self._name)
+                    break
+                self._rx_buf += chunk
+                self._rx_event.set()
+                self._parse_frames(chunk)
+        except OSError as err:
+            _LOGGER.error("%s: Connection error (%s).", self._name, err)
+        if self._reader is reader:
+            self._connection_lost()
+
+    def _parse_frames(self, chunk):
+        """Update the zone cache from any complete status frames received."""
+        self._frame_buf += chunk
+        *lines, rest = self._frame_buf.split(b"\r")
+        self._frame_buf = bytearray(rest[-HAL_MAX_FRAME_SIZE:])
+        for line in lines:
+            if self.trace.enabled:
+                self.trace.record("rx", line)
+            match = HAL_STATUS_FRAME.match(line.strip())
+            if match is None:
+                continue
+            zone, power, source, volume, mute = match.groups()
+            z = int(zone)
+            if z not in self._power:
+                continue
+            state = (power.decode(), source.decode(), volume.decode(), mute.decode())
+            cached = (self._power[z], self._source[z], self._volume[z], self._mute[z])
+            if state == cached:
+                continue
+            self._power[z], self._source[z], self._volume[z], self._mute[z] = state
+            self.stats.count("status_frames")
+            for listener in list(self._listeners):
+                listener(z)
+
+    def _response_complete(self, signature, size):
+        """Return True if size bytes following signature have been received."""
+        if signature is None or size is None:
+            return False
+        index = self._rx_buf.find(signature)
+        return index != -1 and len(self._rx_buf) >= index + len(signature) + size
+
+    async def _read_response(self, signature, size):
+        """Wait until size bytes follow signature, or the HAL goes quiet.
+
+        With no signature (or size None) all data up to the first pause of
+        select interval seconds is returned, matching HALProtocol.
+        """
+        while self.is_connected():
+            if self._response_complete(signature, size):
+                break
+            self._rx_event.clear()
+            try:
+                await asyncio.wait_for(self._rx_event.wait(), self._select_interval)
+            except asyncio.TimeoutError:
+                break
+        return bytes(self._rx_buf)
+
+    async def _write(self, send_msg):
+        """Send a message, spaced from the previous one, with the lock held.
+
+        Returns False if the connection failed.
+        """
+        loop = asyncio.get_running_loop()
+        inter_tx_time = loop.time() - self._last_tx_t
+        if inter_tx_time < HAL_MSG_INTERVAL:
+            await asyncio.sleep(HAL_MSG_INTERVAL - inter_tx_time)
+        self._last_tx_t = loop.time()
+        self._rx_buf.clear()
+        if self.trace.enabled:
+            self.trace.record("tx", send_msg)
+        try:
+            self._writer.write(send_msg + HAL_EOL)
+            await self._writer.drain()
+        except OSError as err:
+            _LOGGER.error("%s: Connection error (%s).", self._name, err)
+            self._connection_lost()
+            return False
+        return True
+
+    async def _send(self, send_msg):
+        """Send a message without waiting for a response."""
+        async with self._lock:
+            if self.is_connected():
+                await self._write(send_msg)
+
+    async def _txrx(self, send_msg, signature=None, size=0):
+        """Send a message and return the bytes received in response."""
+        async with self._lock:
+            if not self.is_connected() or not await self._write(send_msg):
+                return b""
+            loop = asyncio.get_running_loop()
+            rcv_msg = await self._read_response(signature, size)
+            if self._response_complete(signature, size):
+                self._update_select_interval(loop.time() - self._last_tx_t)
+            elif signature is not None and size is not None:
+                self.stats.count("timeouts")
+                self._reset_select_interval()
+            return rcv_msg
+
+    def _update_select_interval(self, rtt):
+        """Adapt the select interval to a measured response time.
+
+        The interval follows the smoothed response time plus a margin of
+        its deviation, kept within the configured bounds.
+        """
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            self._rttvar += HAL_RTT_BETA * (abs(self._srtt - rtt) - self._rttvar)
+            self._srtt += HAL_RTT_ALPHA * (rtt - self._srtt)
+        if self._adaptive:
+            self._select_interval = min(
+                max(self._srtt + HAL_RTT_K * self._rttvar, self._min_interval),
+                self._max_interval,
+            )
+
+    def _reset_select_interval(self):
+        """Fall back to the configured select interval after a missed response."""
+        if self._adaptive and self._srtt is not None:
+            _LOGGER.debug(
+                "%s: Incomplete response, select interval reset to %s.",
+                self._name,
+                self._configured_interval,
+            )
+        self._srtt = None
+        self._rttvar = 0.0
+        self._select_interval = self._configured_interval
+
+    async def _command(self, command, args):
+        """Send a set command and return True if the HAL confirmed it."""
+        signature = HAL_SUCCESS_MSG[command]
+        rcv_msg = await self._txrx(command + args.encode(), signature)
+        if rcv_msg.find(signature) == -1:
+            _LOGGER.error("%s: %s %s failed.", self._name, command, args)
+            return False
+        return True
+
+    async def _get_version(self):
+        """Read the HAL firmware version. Return True if the HAL answered."""
+        signature = HAL_SUCCESS_MSG[GET_VERSION]
+        rcv_msg = await self._txrx(GET_VERSION, signature, None)
+        index = rcv_msg.find(signature)
+        self._version = HAL_UNKNOWN
+        if index == -1:
+            return False
+        data = rcv_msg[index + len(signature) :].split(b"\n\r")[0].split()
+        if data:
+            self._version = data[0].decode()
+        return True
+
+    async def async_ping(self):
+        """Check that the HAL still answers, using a version query."""
+        return await self._get_version()
+
+    async def async_get_zone_info(self, zone):
+        """Read power, source, volume and mute for the zone."""
+        signature = HAL_SUCCESS_MSG[GET_RA_STATUS]
+        rcv_msg = await self._txrx(
+            GET_RA_STATUS + zone.encode(), signature, HAL_RA_STATUS_SIZE
+        )
+        index = rcv_msg.find(signature)
+        if index == -1:
+            _LOGGER.error("%s: Unable to read zone %s.", self._name, zone)
+            return False
+        index += len(signature)
+        data = rcv_msg[index : index + HAL_RA_STATUS_SIZE].decode()
+        z = int(zone)
+        self._power[z] = data[0:2]
+        self._source[z] = data[3:5]
+        self._volume[z] = data[6:8]
+        self._mute[z] = data[12:14]
+        return True
+
+    async def async_set_power(self, zone, power):
+        """Switch power on/off to a zone."""
+        if not await self._command(SET_NODE_POWER, f"{zone} {power}"):
+            return False
+        self._power[int(zone)] = power
+        return True
+
+    async def async_set_volume(self, zone, volume):
+        """Set the volume of a zone, given in the range 0..100."""
+        volume = str((int(volume) * HAL_MAX_VOL) // 100)
+        if not await self._command(SET_NODE_VOL_ABS, f"{zone} {volume}"):
+            return False
+        self._volume[int(zone)] = volume
+        return True
+
+    async def async_set_source(self, zone, source):
+        """Set the source of a zone."""
+        source = f"{int(source):02d}"
+        if not await self._command(SET_NODE_SOURCE, f"{zone} {source}"):
+            return False
+        self._source[int(zone)] = source
+        return True
+
+    async def async_set_mute(self, zone, mute):
+        """Switch mute on/off to a zone."""
+        mute = str(mute)
+        if not await self._command(SET_NODE_MUTE, f"{zone} {mute}"):
+            return False
+        self._mute[int(zone)] = mute
+        return True
+
+    async def async_set_node_status(self, zone, power, source, volume, mute):
+        """Set power, source, volume [0..100] and mute of a zone in one command.
+
+        The HAL answers with a status frame, which updates the zone cache.
+        """
+        source = f"{int(source):02d}"
+        volume = f"{(int(volume) * HAL_MAX_VOL) // 100:02d}"
+        signature = HAL_SUCCESS_MSG[SET_NODE_STATUS]
+        rcv_msg = await self._txrx(
+            SET_NODE_STATUS + f"{zone} {power} {source} {volume} {mute}".encode(),
+            signature,
+            HAL_SE_STATUS_SIZE,
+        )
+        index = rcv_msg.find(signature)
+        match = None
+        if index != -1:
+            match = HAL_STATUS_FRAME.match(rcv_msg[index:].split(b"\r")[0].strip())
+        if match is None or int(match.group(1)) != int(zone):
+            _LOGGER.error("%s: Setting status of zone %s failed.", self._name, zone)
+            return False
+        z = int(zone)
+        self._power[z], self._source[z], self._volume[z], self._mute[z] = (
+            value.decode() for value in match.groups()[1:]
+        )
+        return True
+
+    async def async_turn_off(self):
+        """Turn off all zones."""
+        return await self._command(SET_SYSTEM_PWR_SAVE, "")
+
+    def get_select_interval(self):
+        """Return the time to wait for the HAL to finish responding."""
+        return self._select_interval
+
+    def set_select_interval(self, interval):
+        """Change the time to wait for the HAL to finish responding.
+
+        With an adaptive select interval, this is the value used until
+        response times have been measured, and after a missed response.
+        """
+        self._configured_interval = float(interval)
+        self._reset_select_interval()
+
+    def set_adaptive_interval(self, min_interval, max_interval):
+        """Adapt the select interval to the measured response times.
+
+        The interval is kept between min_interval and max_interval seconds.
+        """
+        self._min_interval = float(min_interval)
+        self._max_interval = float(max_interval)
+        self._adaptive = True
+        self._reset_select_interval()
+
+    def disable_adaptive_interval(self):
+        """Always wait the configured select interval."""
+        self._adaptive = False
+        self._reset_select_interval()
+
+    def get_response_time(self):
+        """Return the smoothed response time of the HAL, or None if unknown."""
+        return self._srtt
+
+    def get_version(self):
+        """Return the HAL firmware version."""
+        return self._version
+
+    def get_power(self, zone):
+        """Return the cached power state of the zone."""
+        return self._power[int(zone)]
+
+    def get_source(self, zone):
+        """Return the cached source of the zone."""
+        return self._source[int(zone)]
+
+    def get_volume(self, zone):
+        """Return the cached volume [0..100] of the zone, or HAL_UNKNOWN."""
+        volume = self._volume[int(zone)]
+        if volume == HAL_UNKNOWN:
+            return HAL_UNKNOWN
+        return f"{(int(volume) * 100) // HAL_MAX_VOL}"
+
+    def get_mute(self, zone):
+        """Return the cached mute state of the zone."""
+        return self._mute[int(zone)]
+
+
+class HALExecutorClient:
+    """Fallback client running the blocking HALProtocol in the executor."""
+
+    def __init__(self, hass, host, port, name="", stats=None):
+        """Initialize the client."""
+        self._hass = hass
+        self._host = host
+        self._port = port
+        self._name = name
+        self.stats = stats or HALStats()
+        # HALProtocol logs its own frames; this trace stays empty
+        self.trace = FrameTrace(name)
+        self._hal = HALProtocol(host, port, name=name)
+        self._hal.enable_logger()
+        self._used = False
+
+    def is_connected(self):
+        """Return True if the socket to the HAL is connected."""
+        return self._hal.is_connected()
+
+    def set_disconnect_listener(self, listener):
+        """HALProtocol does not report dropped connections; nothing to do."""
+
+    async def async_connect(self):
+        """Connect to the HAL.
+
+        A HALProtocol socket cannot be reused once it has been connected (or
+        has failed to connect), so reconnecting replaces the protocol object,
+        keeping its select interval.
+        """
+        if self._used:
+            hal = HALProtocol(self._host, self._port, name=self._name)
+            hal.set_select_interval(self._hal.get_select_interval())
+            hal.enable_logger()
+            self._hal = hal
+        self._used = True
+        connected = await self._hass.async_add_executor_job(self._hal.connect)
+        self.stats.count("connects" if connected else "connect_failures")
+        return connected
+
+    async def async_ping(self):
+        """Check that the HAL still answers, using a version query."""
+        return await self._hass.async_add_executor_job(self._ping)
+
+    def _ping(self):
+        """Query the firmware version; HALProtocol only exposes the cached one."""
+        try:
+            self._hal._get_version()  # pylint: disable=protected-access
+        except OSError:
+            return False
+        return self._hal.get_version() != HAL_UNKNOWN
+
+    async def async_disconnect(self):
+        """Disconnect from the HAL, without waiting on it for too long.
+
+        A blocked executor job cannot be interrupted, so on timeout it is left
+        to finish in the background.
+        """
+        try:
+            await asyncio.wait_for(
+                self._hass.async_add_executor_job(self._hal.disconnect),
+                HAL_CLOSE_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            _LOGGER.warning("%s: Timeout disconnecting from the HAL.", self._name)
+
+    async def async_get_zone_info(self, zone):
+        """Read power, source, volume and mute for the zone."""
+        return await self._hass.async_add_executor_job(self._hal.get_zone_info, zone)
+
+    async def async_set_power(self, zone, power):
+        """Switch power on/off to a zone."""
+        return await self._hass.async_add_executor_job(self._hal.set_power, zone, power)
+
+    async def async_set_volume(self, zone, volume):
+        """Set the volume of a zone, given in the range 0..100."""
+        return await self._hass.async_add_executor_job(
+            self._hal.set_volume, zone, volume
+        )
+
+    async def async_set_source(self, zone, source):
+        """Set the source of a zone."""
+        return await self._hass.async_add_executor_job(
+            self._hal.set_source, zone, source
+        )
+
+    async def async_set_mute(self, zone, mute):
+        """Switch mute on/off to a zone."""
+        return await self._hass.async_add_executor_job(self._hal.set_mute, zone, mute)
+
+    async def async_set_node_status(self, zone, power, source, volume, mute):
+        """Set power, source, volume [0..100] and mute of a zone in one command."""
+        return await self._hass.async_add_executor_job(
+            self._hal.set_node_status, zone, power, f"{int(source):02d}", volume, mute
+        )
+
+    async def async_turn_off(self):
+        """Turn off all zones."""
+        return await self._hass.async_add_executor_job(self._hal.turn_off)
+
+    def get_select_interval(self):
+        """Return the select interval used by HALProtocol."""
+        return self._hal.get_select_interval()
+
+    def set_select_interval(self, interval):
+        """Change the select interval used by HALProtocol."""
+        self._hal.set_select_interval(interval)
+
+    def set_adaptive_interval(self, min_interval, max_interval):
+        """HALProtocol always waits a full select interval; nothing to adapt."""
+
+    def disable_adaptive_interval(self):
+        """HALProtocol always waits a full select interval; nothing to do."""
+
+    def get_response_time(self):
+        """HALProtocol does not measure response times."""
+        return None
+
+    def get_version(self):
+        """Return the HAL firmware version."""
+        return self._hal.get_version()
+
+    def get_power(self, zone):
+        """Return the cached power state of the zone."""
+        return self._hal.get_power(zone)
+
+    def get_source(self, zone):
+        """Return the cached source of the zone."""
+        return self._hal.get_source(zone)
+
+    def get_volume(self, zone):
+        """Return the cached volume [0..100] of the zone, or HAL_UNKNOWN."""
+        try:
+            return self._hal.get_volume(zone)
+        except ValueError:
+            # HALProtocol converts its cached HAL_UNKNOWN to a number
+            return HAL_UNKNOWN
+
+    def get_mute(self, zone):
+        """Return the cached mute state of the zone."""
+        return self._hal.get_mute(zone)
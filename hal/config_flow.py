@@ -4,6 +4,7 @@ import logging
 import voluptuous as vol
 
 from homeassistant import config_entries, core, exceptions
+from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
 
 from .const import (
@@ -14,40 +15,31 @@ from .const import (
     DEFAULT_HAL_NAME,
     CONF_HAL_SELECT_INTERVAL,
     DEFAULT_SELECT_INTERVAL,
-    CONF_ZONE_1,
-    CONF_ZONE_2,
-    CONF_ZONE_3,
-    CONF_ZONE_4,
-    CONF_ZONE_5,
-    CONF_ZONE_6,
-    CONF_SOURCE_1,
-    CONF_SOURCE_2,
-    CONF_SOURCE_3,
-    CONF_SOURCE_4,
-    CONF_SOURCE_5,
-    CONF_SOURCE_6,
-    CONF_SOURCE_7,
-    CONF_SOURCE_8,
-    HAL_ZONE_1_VALID,
-    HAL_ZONE_2_VALID,
-    HAL_ZONE_3_VALID,
-    HAL_ZONE_4_VALID,
-    HAL_ZONE_5_VALID,
-    HAL_ZONE_6_VALID,
-    HAL_SOURCE_1_VALID,
-    HAL_SOURCE_2_VALID,
-    HAL_SOURCE_3_VALID,
-    HAL_SOURCE_4_VALID,
-    HAL_SOURCE_5_VALID,
-    HAL_SOURCE_6_VALID,
-    HAL_SOURCE_7_VALID,
-    HAL_SOURCE_8_VALID,
+    CONF_HAL_ADAPTIVE_INTERVAL,
+    DEFAULT_ADAPTIVE_INTERVAL,
+    CONF_HAL_SELECT_INTERVAL_MIN,
+    DEFAULT_SELECT_INTERVAL_MIN,
+    CONF_HAL_SELECT_INTERVAL_MAX,
+    DEFAULT_SELECT_INTERVAL_MAX,
+    CONF_HAL_LEGACY_PROTOCOL,
+    DEFAULT_LEGACY_PROTOCOL,
+    CONF_HAL_PUSH,
+    DEFAULT_PUSH,
+    CONF_HAL_OPTIMISTIC,
+    DEFAULT_OPTIMISTIC,
+    HAL_PROBE_TIMEOUT,
+    HAL_SCAN_INTERVAL,
+    HAL_ZONES,
+    HAL_SOURCES,
 )
 from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PORT, CONF_SCAN_INTERVAL
 
-from halca1006 import HALProtocol
 import asyncio
 
+from . import configure_client
+from .client import create_client
+from .runtime import async_get_runtime
+
 HAL_TESTS_PASSED = 1
 HAL_CANNOT_CONNECT = 2
 HAL_NOT_HAL = 3
@@ -68,117 +60,17 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
         # vol.Optional(CONF_SCAN_INTERVAL, default=10): int,
         vol.Optional(CONF_HAL_SELECT_INTERVAL, default=DEFAULT_SELECT_INTERVAL): float,
         vol.Optional(
-            HAL_ZONE_1_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_ZONE_1,
-            default="Zone 1",
-        ): str,
-        vol.Optional(
-            HAL_ZONE_2_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_ZONE_2,
-            default="Zone 2",
-        ): str,
-        vol.Optional(
-            HAL_ZONE_3_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_ZONE_3,
-            default="Zone 3",
-        ): str,
-        vol.Optional(
-            HAL_ZONE_4_VALID,
-            default=True,
+            CONF_HAL_ADAPTIVE_INTERVAL, default=DEFAULT_ADAPTIVE_INTERVAL
         ): bool,
         vol.Optional(
-            CONF_ZONE_4,
-            default="Zone 4",
-        ): str,
-        vol.Optional(
-            HAL_ZONE_5_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_ZONE_5,
-            default="Zone 5",
-        ): str,
-        vol.Optional(
-            HAL_ZONE_6_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_ZONE_6,
-            default="Zone 6",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_1_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_1,
-            default="Source 1",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_2_VALID,
-            default=True,
-        ): bool,
+            CONF_HAL_SELECT_INTERVAL_MIN, default=DEFAULT_SELECT_INTERVAL_MIN
+        ): float,
         vol.Optional(
-            CONF_SOURCE_2,
-            default="Source 2",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_3_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_3,
-            default="Source 3",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_4_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_4,
-            default="Source 4",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_5_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_5,
-            default="Source 5",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_6_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_6,
-            default="Source 6",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_7_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_7,
-            default="Source 7",
-        ): str,
-        vol.Required(
-            HAL_SOURCE_8_VALID,
-            default=True,
-        ): bool,
-        vol.Optional(
-            CONF_SOURCE_8,
-            default="Source 8",
-        ): str,
+            CONF_HAL_SELECT_INTERVAL_MAX, default=DEFAULT_SELECT_INTERVAL_MAX
+        ): float,
+        vol.Optional(CONF_HAL_LEGACY_PROTOCOL, default=DEFAULT_LEGACY_PROTOCOL): bool,
+        vol.Optional(CONF_HAL_PUSH, default=DEFAULT_PUSH): bool,
+        vol.Optional(CONF_HAL_OPTIMISTIC, default=DEFAULT_OPTIMISTIC): bool,
     }
 )
 
@@ -189,42 +81,95 @@ class HALTests:
     TODO Remove this placeholder class and replace with things from your PyPI package.
     """
 
-    def __init__(self, host, port):
-        """Initialize."""
-        _LOGGER.debug(f"HALTests.__init__(): host = {host}, port = {port}")
+    def __init__(self, host, port, legacy=DEFAULT_LEGACY_PROTOCOL, config=None):
+        """Initialize.
+
+        config holds the select interval settings to probe the unit with.
+        """
+        _LOGGER.debug("HALTests.__init__(): host = %s, port = %s", host, port)
         self.host = host
         self.port = port
+        self.legacy = legacy
+        self.config = config or {CONF_HAL_SELECT_INTERVAL: DEFAULT_SELECT_INTERVAL}
 
     async def validate(self, hass) -> dict:
-        """Test if we can authenticate with the host."""
+        """Test if we can authenticate with the host.
+
+        Connecting and probing the unit is bounded by HAL_PROBE_TIMEOUT. On
+        success the connection is left open and returned as "client", so
+        that the entry setup can use it instead of connecting again.
+        """
         _LOGGER.debug("HALTests.validate()")
         validate_results = {
             "connect": HAL_TESTS_PASSED,
             "is_hal": HAL_TESTS_PASSED,
             "fw_version": HAL_VERSION_UNKNOWN,
+            "zones": [],
+            "sources": [],
+            "client": None,
         }
-        hal = HALProtocol(self.host, self.port)
-        _LOGGER.debug("Enabling HALProtocol logger")
-        hal.enable_logger()
-        _LOGGER.debug(f"Checking we can connect to HAL at {self.host}, {self.port}.")
-        if not await hass.async_add_executor_job(hal.connect):
+        hal = create_client(
+            hass,
+            self.host,
+            self.port,
+            name=self.config.get(CONF_HAL_NAME, ""),
+            legacy=self.legacy,
+        )
+        configure_client(hal, self.config)
+        _LOGGER.debug("Checking we can connect to HAL at %s, %s.", self.host, self.port)
+        try:
+            async with asyncio.timeout(HAL_PROBE_TIMEOUT):
+                if await hal.async_connect():
+                    # TODO add an is_hal() method to the HAL client to validate we are
+                    #      connecting to a HAL unit. Throw InvalidAuth if it is not.
+                    validate_results["fw_version"] = hal.get_version()
+                    zones, sources = await self.discover(hal)
+                    validate_results["zones"] = zones
+                    validate_results["sources"] = sources
+                    validate_results["client"] = hal
+                else:
+                    _LOGGER.error(
+                        "HALTests.validate: Unable to connect. "
+                        "Returning HAL_CANNOT_CONNECT."
+                    )
+                    validate_results["connect"] = HAL_CANNOT_CONNECT
+        except TimeoutError:
             _LOGGER.error(
-                f"HALTests.validate: Unable to connect. Returning HAL_CANNOT_CONNECT."
+                "HALTests.validate: No answer within %s seconds. "
+                "Returning HAL_CANNOT_CONNECT.",
+                HAL_PROBE_TIMEOUT,
             )
             validate_results["connect"] = HAL_CANNOT_CONNECT
-        else:
-            # TODO add an is_hal() method to the HALProtocol class to validate we are connecting
-            #      to a HAL unit. Throw InvalidAuth if it's not a HAL.
-            validate_results["fw_version"] = await hass.async_add_executor_job(
-                hal.get_version
-            )
-            await hass.async_add_executor_job(hal.disconnect)
-        _LOGGER.debug(
-            f"HALTests.validate() complete. " f"Results are {validate_results}."
-        )
+        if validate_results["client"] is None:
+            await hal.async_disconnect()
+        _LOGGER.debug("HALTests.validate() complete. Results are %s.", validate_results)
 
         return validate_results
 
+    async def discover(self, hal):
+        """Return the zones that answer a status read and the sources they use.
+
+        The CA1006 cannot tell whether speakers or inputs are connected, so
+        a zone is taken to be in use if it answers, and a source if one of
+        those zones has it selected. The zones are read concurrently, so
+        the reads go out back to back; the blocking legacy driver reads
+        them one at a time.
+        """
+        zone_ids = range(1, HAL_ZONES + 1)
+        if self.legacy:
+            answered = [await hal.async_get_zone_info(str(z)) for z in zone_ids]
+        else:
+            answered = await asyncio.gather(
+                *(hal.async_get_zone_info(str(z)) for z in zone_ids)
+            )
+        zones = [z for z, ok in zip(zone_ids, answered) if ok]
+        sources = set()
+        for z in zones:
+            source = hal.get_source(str(z))
+            if source.isdigit() and 1 <= int(source) <= HAL_SOURCES:
+                sources.add(int(source))
+        return zones, sorted(sources)
+
 
 async def validate_input(hass: core.HomeAssistant, data):
     """Validate the user input allows us to connect.
@@ -249,9 +194,12 @@ async def validate_input(hass: core.HomeAssistant, data):
     # If the authentication is wrong:
     # InvalidAuth
 
-    _LOGGER.debug(f"hal.config_flow.validate_input: data = {data}")
-    _LOGGER.debug("Instantiate HALTests")
-    hal_tests = HALTests(data["host"], data["port"])
+    hal_tests = HALTests(
+        data["host"],
+        data["port"],
+        data.get(CONF_HAL_LEGACY_PROTOCOL, DEFAULT_LEGACY_PROTOCOL),
+        data,
+    )
     test_results = await hal_tests.validate(hass)
     if test_results["connect"] == HAL_CANNOT_CONNECT:
         raise CannotConnect
@@ -261,14 +209,15 @@ async def validate_input(hass: core.HomeAssistant, data):
     # Obtain firmware version of the HAL
     fw_version = HAL_VERSION_UNKNOWN
     fw_version = test_results["fw_version"]
-    _LOGGER.debug(f"HAL firmware version is {fw_version}.")
-
-    _LOGGER.debug("HALTests Completed")
+    _LOGGER.debug("HAL firmware version is %s.", fw_version)
 
     # Return info that you want to store in the config entry.
     return {
         "title": data[CONF_HAL_NAME],
         "sw_version": fw_version,
+        "zones": test_results["zones"],
+        "sources": test_results["sources"],
+        "client": test_results["client"],
     }
 
 
@@ -276,13 +225,22 @@ class HALConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for HAL CA1006 multi-zone amplifier."""
 
     VERSION = 1
-    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
+    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow of a HAL unit."""
+        return HALOptionsFlowHandler(config_entry)
 
     def __init__(self):
         """Initialize."""
         self.hal = None
         self.host = None
         self.port = None
+        self._data = None
+        self._discovered = None
+        self._probe = None  # (host, port, legacy) of the kept connection
 
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
@@ -293,6 +251,8 @@ class HALConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         errors = {}
 
+        await self.async_set_unique_id(user_input[CONF_HAL_NAME])
+        self._abort_if_unique_id_configured()
         try:
             info = await validate_input(self.hass, user_input)
         except CannotConnect:
@@ -303,17 +263,149 @@ class HALConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             _LOGGER.exception("Unexpected exception")
             errors["base"] = "unknown"
         else:
-            _LOGGER.debug(f"Set unique identifier to {user_input[CONF_HAL_NAME]}")
-            await self.async_set_unique_id(user_input[CONF_HAL_NAME])
-            _LOGGER.debug(f"async_step_user: Self is {self}")
-            self._abort_if_unique_id_configured()
-            user_input["sw_version"] = info["sw_version"]
-            return self.async_create_entry(title=info["title"], data=user_input)
+            # The entry setup takes over the connection of the probe
+            self._probe = (
+                user_input[CONF_HOST],
+                user_input[CONF_PORT],
+                user_input.get(CONF_HAL_LEGACY_PROTOCOL, DEFAULT_LEGACY_PROTOCOL),
+            )
+            async_get_runtime(self.hass).async_keep_probe(*self._probe, info["client"])
+            self._data = {**user_input, "sw_version": info["sw_version"]}
+            self._discovered = _discovered_config(info["zones"], info["sources"])
+            return await self.async_step_zones()
 
         return self.async_show_form(
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
 
+    @callback
+    def async_remove(self):
+        """Close the connection of the probe, unless the entry setup took it."""
+        if self._probe is not None:
+            async_get_runtime(self.hass).async_discard_probe(*self._probe)
+
+    async def async_step_zones(self, user_input=None):
+        """Confirm the zones and sources found on the unit, and name them."""
+        if user_input is None:
+            found = [
+                str(i)
+                for i in range(1, HAL_ZONES + 1)
+                if self._discovered[f"zone_{i}_valid"]
+            ]
+            return self.async_show_form(
+                step_id="zones",
+                data_schema=vol.Schema(_zones_schema(self._discovered)),
+                description_placeholders={"zones": ", ".join(found) or "none"},
+            )
+        return self.async_create_entry(
+            title=self._data[CONF_HAL_NAME],
+            data={**self._data, **self._discovered, **user_input},
+        )
+
+
+def _zones_schema(config):
+    """Return the zone and source fields, filled in with config."""
+    schema = {}
+    for i in range(1, HAL_ZONES + 1):
+        schema[
+            vol.Optional(f"zone_{i}_valid", default=config[f"zone_{i}_valid"])
+        ] = bool
+        schema[vol.Optional(f"zone_{i}", default=config[f"zone_{i}"])] = str
+    for i in range(1, HAL_SOURCES + 1):
+        schema[
+            vol.Optional(f"source_{i}_valid", default=config[f"source_{i}_valid"])
+        ] = bool
+        schema[vol.Optional(f"source_{i}", default=config[f"source_{i}"])] = str
+    return schema
+
+
+def _discovered_config(zones, sources):
+    """Return zone and source settings pre-filled from a probe of the unit.
+
+    Zones that answered the probe are marked as having speakers. Sources
+    selected by any of those zones are marked as inputs; if no zone
+    answered, all sources are.
+    """
+    sources = sources or range(1, HAL_SOURCES + 1)
+    config = {}
+    for i in range(1, HAL_ZONES + 1):
+        config[f"zone_{i}_valid"] = i in zones
+        config[f"zone_{i}"] = f"Zone {i}"
+    for i in range(1, HAL_SOURCES + 1):
+        config[f"source_{i}_valid"] = i in sources
+        config[f"source_{i}"] = f"Source {i}"
+    return config
+
+
+def _options_schema(config):
+    """Return the options form, filled in with the current configuration."""
+    schema = {
+        vol.Optional(
+            CONF_SCAN_INTERVAL,
+            default=config.get(CONF_SCAN_INTERVAL, HAL_SCAN_INTERVAL),
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(
+            CONF_HAL_SELECT_INTERVAL, default=config[CONF_HAL_SELECT_INTERVAL]
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(
+            CONF_HAL_ADAPTIVE_INTERVAL,
+            default=config.get(CONF_HAL_ADAPTIVE_INTERVAL, DEFAULT_ADAPTIVE_INTERVAL),
+        ): bool,
+        vol.Optional(
+            CONF_HAL_SELECT_INTERVAL_MIN,
+            default=config.get(
+                CONF_HAL_SELECT_INTERVAL_MIN, DEFAULT_SELECT_INTERVAL_MIN
+            ),
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(
+            CONF_HAL_SELECT_INTERVAL_MAX,
+            default=config.get(
+                CONF_HAL_SELECT_INTERVAL_MAX, DEFAULT_SELECT_INTERVAL_MAX
+            ),
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(
+            CONF_HAL_OPTIMISTIC,
+            default=config.get(CONF_HAL_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+        ): bool,
+    }
+    schema.update(_zones_schema(config))
+    return vol.Schema(schema)
+
+
+class HALOptionsFlowHandler(config_entries.OptionsFlow):
+    """Change the zones, sources and timing of a HAL unit.
+
+    The options are applied to the running unit without reconnecting.
+    """
+
+    def __init__(self, config_entry):
+        """Initialize.
+
+        Home Assistant sets config_entry itself from 2024.11, and rejects
+        flows that assign it; older cores leave it to the flow.
+        """
+        if not hasattr(config_entries.OptionsFlow, "config_entry"):
+            self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Show and validate the options form."""
+        errors = {}
+        if user_input is not None:
+            if (
+                user_input[CONF_HAL_SELECT_INTERVAL_MIN]
+                > user_input[CONF_HAL_SELECT_INTERVAL_MAX]
+            ):
+                errors["base"] = "invalid_interval_range"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        config = {**self.config_entry.data, **self.config_entry.options}
+        if user_input is not None:
+            config.update(user_input)
+        return self.async_show_form(
+            step_id="init", data_schema=_options_schema(config), errors=errors
+        )
+
 
 class CannotConnect(exceptions.HomeAssistantError):
     """Error to indicate we cannot connect."""
@@ -8,12 +8,29 @@ MANUFACTURER = "HAL"
 HAL_MODULE = "hal"
 HAL_OBJECT = "hal"
 HAL_COORDINATOR = "coordinator"
+HAL_SCHEDULER = "scheduler"
+HAL_SOURCE_MAP = "source_map"
+HAL_SUPERVISOR = "supervisor"
+HAL_RUNTIME = "runtime"
+HAL_SNAPSHOTS = "snapshots"
 HAL_VERSION = "version"
 
 CONF_HAL_NAME = "hal_name"
 DEFAULT_HAL_NAME = "HAL"
 CONF_HAL_SELECT_INTERVAL = "hal_select_interval"
 DEFAULT_SELECT_INTERVAL = 0.5
+CONF_HAL_ADAPTIVE_INTERVAL = "hal_adaptive_interval"
+DEFAULT_ADAPTIVE_INTERVAL = True
+CONF_HAL_SELECT_INTERVAL_MIN = "hal_select_interval_min"
+DEFAULT_SELECT_INTERVAL_MIN = 0.05
+CONF_HAL_SELECT_INTERVAL_MAX = "hal_select_interval_max"
+DEFAULT_SELECT_INTERVAL_MAX = 2.0
+CONF_HAL_LEGACY_PROTOCOL = "hal_legacy_protocol"
+DEFAULT_LEGACY_PROTOCOL = False
+CONF_HAL_PUSH = "hal_push"
+DEFAULT_PUSH = True
+CONF_HAL_OPTIMISTIC = "hal_optimistic"
+DEFAULT_OPTIMISTIC = True
 CONF_ZONES = "zones"
 CONF_SOURCES = "sources"
 CONF_ZONE_1 = "zone_1"
@@ -55,8 +72,53 @@ HAL_OFF = "00"
 HAL_MUTED = "01"
 HAL_NOT_MUTED = "00"
 
-HAL_SCAN_INTERVAL = 10  # Seconds
+HAL_ATTR_POWER = "power"
+HAL_ATTR_SOURCE = "source"
+HAL_ATTR_VOLUME = "volume"
+HAL_ATTR_MUTE = "mute"
+HAL_ATTR_STATUS = "status"
+HAL_ATTR_ENABLED = "enabled"
+HAL_ATTR_DURATION = "duration"
+HAL_ATTR_CURVE = "curve"
+HAL_ATTR_SNAPSHOT = "snapshot"
+HAL_ATTR_PERSIST = "persist"
+DEFAULT_SNAPSHOT = "default"
+
+HAL_SCAN_INTERVAL = 10  # Seconds, for zones that are on or recently active
+HAL_IDLE_SCAN_INTERVAL = 120  # Seconds, for zones that are off and idle
+HAL_IDLE_TIMEOUT = 600  # Seconds without activity before an off zone is idle
+HAL_BURST_SCAN_INTERVAL = 1  # Seconds, for zones that have just been changed
+HAL_BURST_POLLS = 3  # Fast polls of a zone after it has been changed
+HAL_POLL_TICK = 1  # Seconds between checks for zones that are due to be polled
+HAL_PUSH_SCAN_INTERVAL = 300  # Seconds between consistency sweeps in push mode
+HAL_MAX_POLL_FAILURES = 3  # Polls in a row reading no zone before giving up
 HAL_CONNECT_RETRY_INTERVAL = 10  # Seconds
+HAL_CONNECT_TIMEOUT = 5  # Seconds
+HAL_PROBE_TIMEOUT = 10  # Seconds for the config flow to connect and probe a unit
+HAL_SHUTDOWN_TIMEOUT = 3  # Seconds to send the queued commands when unloading
+HAL_CLOSE_TIMEOUT = 1  # Seconds to close the connection before abandoning it
+HAL_KEEPALIVE_INTERVAL = 60  # Seconds between connection checks
+HAL_RECONNECT_MIN_DELAY = 1  # Seconds
+HAL_RECONNECT_MAX_DELAY = 60  # Seconds
+HAL_MAX_CONCURRENT_IO = 4  # Requests in flight across all HAL units
+HAL_MAX_CONCURRENT_CONNECTS = 16  # Connects in progress across all HAL units
+HAL_STATS_WINDOW = 200  # Most recent requests per type kept for latency stats
+HAL_TRACE_FRAMES = 100  # Most recent frames kept while the frame trace is on
+HAL_DIAGNOSTICS_SCAN_INTERVAL = 30  # Seconds between diagnostic sensor updates
+HAL_STATE_SAVE_DELAY = 10  # Seconds to batch zone state changes before saving
+HAL_RAMP_MAX_DURATION = 3600  # Seconds
+
+STORAGE_KEY = f"{DOMAIN}.{{}}"  # Last known zone state, by config entry id
+STORAGE_KEY_SNAPSHOTS = f"{DOMAIN}.{{}}.snapshots"  # Snapshots, by config entry id
+STORAGE_VERSION = 1
 
 SERVICE_TURN_OFF = "turn_off"
-SERVICE_SET_SELECT_INTERVAL = "set_select_interval"
\ No newline at end of file
+SERVICE_SET_SELECT_INTERVAL = "set_select_interval"
+SERVICE_SET_ZONES = "set_zones"
+SERVICE_SET_FRAME_TRACE = "set_frame_trace"
+SERVICE_RAMP_VOLUME = "ramp_volume"
+SERVICE_SNAPSHOT = "snapshot"
+SERVICE_RESTORE = "restore"
+
+# Sent with the entry id when the options of a HAL unit have been applied
+SIGNAL_HAL_OPTIONS_UPDATED = f"{DOMAIN}_options_updated_{{}}"
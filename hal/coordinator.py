@@ -0,0 +1,320 @@
+"""The HAL CA1006 data update coordinator.
+
+A single coordinator per HAL unit polls the valid zones and fans the results
+out to the zone entities. Each zone is polled at a rate that depends on its
+activity: a few fast polls right after it has been changed, the scan interval
+while it is on or has been active recently, and a slow rate once it has been
+off and idle for a while. In push mode the zone state is kept current from the
+status frames pushed by the HAL, and polling is reduced to a slow consistency
+sweep of all zones. Polls are scheduled by the runtime shared by all units, so
+the coordinator has no update interval of its own.
+"""
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .client import HAL_UNKNOWN, step_volume, volume_step
+from .const import (
+    HAL_ATTR_MUTE,
+    HAL_ATTR_POWER,
+    HAL_ATTR_SOURCE,
+    HAL_ATTR_VOLUME,
+    HAL_BURST_POLLS,
+    HAL_BURST_SCAN_INTERVAL,
+    HAL_IDLE_SCAN_INTERVAL,
+    HAL_IDLE_TIMEOUT,
+    HAL_MAX_POLL_FAILURES,
+    HAL_MUTED,
+    HAL_NOT_MUTED,
+    HAL_OFF,
+    HAL_ON,
+    HAL_POLL_TICK,
+    HAL_PUSH_SCAN_INTERVAL,
+    HAL_SCAN_INTERVAL,
+)
+from .models import ZoneState
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HALDataUpdateCoordinator(DataUpdateCoordinator):
+    """Fetch the state of all valid zones of a HAL unit."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        hal,
+        scheduler,
+        hal_name,
+        zones,
+        push=False,
+        scan_interval=HAL_SCAN_INTERVAL,
+    ):
+        """Initialize the coordinator.
+
+        zones is the list of zone ids (as strings) that have speakers attached.
+        scan_interval is the number of seconds between polls of a zone that is
+        on or has been active recently. poll_interval is the number of seconds
+        between polls; each poll only queries the zones that are due. Zones are
+        queried through the scheduler, so that user commands are sent ahead of
+        the remaining zones of a refresh cycle.
+        """
+        super().__init__(hass, _LOGGER, name=hal_name, always_update=False)
+        self.poll_interval = HAL_PUSH_SCAN_INTERVAL if push else HAL_POLL_TICK
+        self._hal = hal
+        self._scheduler = scheduler
+        self._hal_name = hal_name
+        self.zones = zones
+        self.scan_interval = scan_interval
+        self._push = push
+        self._next_poll = {}  # zone_id -> loop time the zone is due to be polled
+        self._last_active = {}  # zone_id -> loop time the zone was last changed
+        self._bursts = {}  # zone_id -> fast polls left
+        self._failures = 0  # polls in a row that could not read any zone
+        self._remove_listener = None
+        if push:
+            self._remove_listener = hal.register_listener(self._handle_push)
+
+    def _zone_info(self, zone_id):
+        """Return a snapshot of the state of a zone as cached by the client.
+
+        Returns None while the client has not read the whole zone, such as a
+        zone restored from storage that has only been sent a command since.
+        """
+        info = (
+            self._hal.get_power(zone_id),
+            self._hal.get_source(zone_id),
+            self._hal.get_volume(zone_id),
+            self._hal.get_mute(zone_id),
+        )
+        if HAL_UNKNOWN in info:
+            return None
+        return ZoneState.from_hal(*info)
+
+    async def _async_update_data(self):
+        """Fetch the state of the zones that are due to be polled.
+
+        A zone that cannot be read keeps its last known state. The update only
+        fails when the HAL is disconnected, when no zone has been read yet, or
+        when no zone could be read for HAL_MAX_POLL_FAILURES polls in a row;
+        all zones are then polled on every tick until one answers again.
+        """
+        if not self._hal.is_connected():
+            raise UpdateFailed(f"Not connected to HAL unit {self._hal_name}")
+        now = self.hass.loop.time()
+        # Zones due before the next tick are polled in this one
+        horizon = now + self.poll_interval / 2
+        due = [
+            zone_id
+            for zone_id in self.zones
+            if self._push
+            or not self.last_update_success
+            or self._next_poll.get(zone_id, now) <= horizon
+        ]
+        read = []
+        for zone_id in due:
+            zone_state = None
+            if await self._scheduler.async_query(zone_id):
+                zone_state = self._zone_info(zone_id)
+            known = (self.data or {}).get(zone_id)
+            if zone_state is not None:
+                read.append(zone_id)
+                if known is None or known.restored:
+                    self._last_active[zone_id] = now
+                elif zone_state != known:
+                    # Changed from a keypad or another controller
+                    self._async_mark_active(zone_id)
+            elif known is not None:
+                _LOGGER.warning(
+                    "%s: Unable to read zone %s, keeping last known state.",
+                    self._hal_name,
+                    zone_id,
+                )
+            # Counted from the start of the poll, to stay in step with the ticks
+            self._next_poll[zone_id] = now + self._zone_interval(
+                zone_id, zone_state or known
+            )
+        if due and not read:
+            self._failures += 1
+            if self._failures >= HAL_MAX_POLL_FAILURES or not self.data:
+                raise UpdateFailed(
+                    f"Unable to read any zone of HAL unit {self._hal_name}"
+                )
+        elif read:
+            self._failures = 0
+        # Commands may have been published while the zones were read, and the
+        # client's cache holds the latest of both
+        data = dict(self.data or {})
+        for zone_id in read:
+            data[zone_id] = self._zone_info(zone_id)
+        return data
+
+    def _zone_interval(self, zone_id, zone_state):
+        """Return the seconds until a zone that has just been polled is due."""
+        if self._bursts.get(zone_id):
+            self._bursts[zone_id] -= 1
+            return HAL_BURST_SCAN_INTERVAL
+        if zone_state is None or zone_state.power:
+            # Zones that have never been read are retried at the scan interval
+            return self.scan_interval
+        if self.hass.loop.time() - self._last_active.get(zone_id, 0) < HAL_IDLE_TIMEOUT:
+            return self.scan_interval
+        return HAL_IDLE_SCAN_INTERVAL
+
+    @callback
+    def _async_mark_active(self, zone_id):
+        """Poll a zone that has just been changed fast for a few polls."""
+        now = self.hass.loop.time()
+        self._last_active[zone_id] = now
+        self._bursts[zone_id] = HAL_BURST_POLLS
+        self._next_poll[zone_id] = now + HAL_BURST_SCAN_INTERVAL
+
+    async def async_refresh_all(self):
+        """Poll all zones now, whether or not they are due."""
+        self._next_poll.clear()
+        await self.async_refresh()
+
+    async def async_set_zone_list(self, zones):
+        """Change the zones that are polled.
+
+        Zones that are no longer valid are forgotten; zones that have been
+        added are read at once, leaving the other zones on their schedule.
+        """
+        added = [zone_id for zone_id in zones if zone_id not in self.zones]
+        self.zones = list(zones)
+        for state in (self._next_poll, self._last_active, self._bursts):
+            for zone_id in list(state):
+                if zone_id not in self.zones:
+                    del state[zone_id]
+        if self.data is not None:
+            self.data = {
+                zone_id: zone_state
+                for zone_id, zone_state in self.data.items()
+                if zone_id in self.zones
+            }
+        if added:
+            await self.async_refresh()
+
+    @callback
+    def _handle_push(self, zone):
+        """Publish a zone update pushed by the HAL."""
+        zone_id = str(zone)
+        if zone_id in self.zones:
+            self.async_update_zone(zone_id)
+
+    @callback
+    def async_update_zone(self, *zone_ids):
+        """Publish the client's cached state for one or more zones.
+
+        Commands sent to the HAL update the client's cache on success,
+        so this makes the result visible without another round trip.
+        The zones are then polled fast for a few polls, to pick up
+        anything the HAL did not confirm. A zone the client has not read
+        since startup keeps its restored state until it is polled.
+        """
+        data = dict(self.data or {})
+        for zone_id in zone_ids:
+            self._async_mark_active(zone_id)
+            zone_state = self._zone_info(zone_id)
+            if zone_state is not None:
+                data[zone_id] = zone_state
+        if data == self.data:
+            return
+        self.data = data
+        self.async_update_listeners()
+
+    async def async_set_zones(
+        self, zones, power=None, source=None, volume=None, muted=None
+    ):
+        """Apply the same targets to several zones as one batch.
+
+        Attributes given as None are left as they are and are not sent. Each
+        zone is sent a single node status command when all four attributes
+        are given, and a command per attribute otherwise. All zones are then
+        read back in one pass and published together.
+        """
+        changes = {}
+        if power is not None:
+            changes[HAL_ATTR_POWER] = HAL_ON if power else HAL_OFF
+        if source is not None:
+            changes[HAL_ATTR_SOURCE] = source
+        if volume is not None:
+            changes[HAL_ATTR_VOLUME] = int(volume * 100.0)
+        if muted is not None:
+            changes[HAL_ATTR_MUTE] = HAL_MUTED if muted else HAL_NOT_MUTED
+        if not changes:
+            return
+        targets = []
+        for zone_id in zones:
+            if zone_id not in self.zones:
+                _LOGGER.warning(
+                    "%s: Zone %s is not available, skipping.", self._hal_name, zone_id
+                )
+                continue
+            targets.append(zone_id)
+
+        if None not in (power, source, volume, muted):
+            commands = [
+                self._scheduler.async_set_zone(zone_id, *changes.values())
+                for zone_id in targets
+            ]
+        else:
+            commands = [
+                self._scheduler.async_command(zone_id, attr, value)
+                for zone_id in targets
+                for attr, value in changes.items()
+            ]
+        await asyncio.gather(*commands)
+        await asyncio.gather(
+            *(self._scheduler.async_query(zone_id) for zone_id in targets)
+        )
+        self.async_update_zone(*targets)
+
+    async def async_restore(self, snapshot):
+        """Bring the zones back to a snapshot, sending only what differs.
+
+        A zone that differs in one attribute is sent a command for that
+        attribute alone, and a zone that differs in more is sent a single node
+        status command. The commands of all zones are queued as one batch and
+        the result is published together. Returns the ids of the changed zones.
+        """
+        commands = {}
+        for zone_id, target in snapshot.items():
+            current = (self.data or {}).get(zone_id)
+            if zone_id not in self.zones or current is None:
+                _LOGGER.warning(
+                    "%s: Zone %s is not available, skipping.", self._hal_name, zone_id
+                )
+                continue
+            power = HAL_ON if target.power else HAL_OFF
+            # Sent back as it is, a volume read from the HAL drops a step
+            volume = step_volume(volume_step(round(target.volume * 100)))
+            mute = HAL_MUTED if target.muted else HAL_NOT_MUTED
+            changes = [
+                (attr, value)
+                for attr, value, differs in (
+                    (HAL_ATTR_POWER, power, target.power != current.power),
+                    (HAL_ATTR_SOURCE, target.source, target.source != current.source),
+                    (HAL_ATTR_VOLUME, volume, target.volume != current.volume),
+                    (HAL_ATTR_MUTE, mute, target.muted != current.muted),
+                )
+                if differs
+            ]
+            if len(changes) == 1:
+                commands[zone_id] = self._scheduler.async_command(zone_id, *changes[0])
+            elif changes:
+                commands[zone_id] = self._scheduler.async_set_zone(
+                    zone_id, power, target.source, volume, mute
+                )
+        await asyncio.gather(*commands.values())
+        self.async_update_zone(*commands)
+        return list(commands)
+
+    @callback
+    def async_stop_push(self):
+        """Stop listening for updates pushed by the HAL."""
+        if self._remove_listener is not None:
+            self._remove_listener()
+            self._remove_listener = None
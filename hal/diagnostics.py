@@ -0,0 +1,46 @@
+"""Diagnostics support for the HAL CA1006 multi-zone amplifier integration."""
+from dataclasses import asdict
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    HAL_COORDINATOR,
+    HAL_OBJECT,
+    HAL_SCHEDULER,
+)
+
+TO_REDACT = {CONF_HOST}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return diagnostics for a HAL unit."""
+    unit = hass.data[DOMAIN][entry.entry_id]
+    hal = unit[HAL_OBJECT]
+    coordinator = unit[HAL_COORDINATOR]
+    response_time = hal.get_response_time()
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "connection": {
+            "connected": hal.is_connected(),
+            "version": hal.get_version(),
+            "select_interval": hal.get_select_interval(),
+            "response_time_ms": (
+                round(response_time * 1000, 1) if response_time is not None else None
+            ),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "poll_interval": coordinator.poll_interval,
+            "zones": {
+                zone_id: asdict(zone_state)
+                for zone_id, zone_state in (coordinator.data or {}).items()
+            },
+        },
+        "queue_depth": unit[HAL_SCHEDULER].queue_depth,
+        "stats": hal.stats.as_dict(),
+        "frame_trace": hal.trace.as_dict(),
+    }
@@ -8,19 +8,18 @@ from .const import DOMAIN, MANUFACTURER, MODEL
 class HALEntity(CoordinatorEntity):
     """Base class for HAL entities."""
 
-    def __init__(self, coordinator, name, version="TBD"):
-        """Initialize the sensor."""
+    def __init__(self, coordinator, hal_name, version="TBD"):
+        """Initialize the entity."""
         super().__init__(coordinator)
-        self._name = name
-        self.base_unique_id = "_".join(name)
+        self._hal_name = hal_name
         self._version = version
 
     @property
     def device_info(self):
-        """Powerwall device info."""
+        """HAL unit device info."""
         device_info = {
-            "identifiers": {(DOMAIN, self.base_unique_id)},
-            "name": self._name,
+            "identifiers": {(DOMAIN, self._hal_name)},
+            "name": self._hal_name,
             "manufacturer": MANUFACTURER,
         }
         device_info["model"] = MODEL
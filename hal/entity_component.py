@@ -72,7 +72,7 @@ async def async_setup(hass: HomeAssistant, config: dict):
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
-    _LOGGER.debug(f"async_unload_entry: entry {entry}")
+    _LOGGER.debug("async_unload_entry: entry %s", entry.entry_id)
     unload_ok = all(
         await asyncio.gather(
             *[hass.config_entries.async_forward_entry_unload(entry, "entity")]
@@ -87,9 +87,6 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
 async def async_setup_entry(hass, config, async_add_entities):
     """Set up the HAL CA1006 platform."""
 
-    _LOGGER.debug(f"async_setup_platform: config {config}")
-    _LOGGER.debug(f"async_setup_platform: config data {config.data}")
-
     hal = hass.data[DOMAIN][config.entry_id]
 
     # # Determine sources and zones
@@ -169,8 +166,9 @@ class HALDevice(EntityComponent):
         self._hal_name = hal_name
         self._scan_interval = scan_interval
         _LOGGER.debug(
-            f"HALDevice: Instantianating HALDevice {self._hal_name} "
-            f"with scan interval {self._scan_interval}"
+            "HALDevice: Instantiating HALDevice %s with scan interval %s",
+            self._hal_name,
+            self._scan_interval,
         )
 
     @property
@@ -1,4 +1,5 @@
 """The HAL CA1006 multi-zone amplifier integration."""
+from dataclasses import replace
 from datetime import timedelta
 from typing import Optional
 import logging
@@ -9,16 +10,16 @@ import async_timeout
 from homeassistant.helpers.entity import Entity
 import asyncio
 
-from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 from homeassistant.const import (
     CONF_HOST,
     CONF_NAME,
     CONF_PORT,
     CONF_SCAN_INTERVAL,
-    EVENT_HOMEASSISTANT_STOP,
     STATE_OFF,
     STATE_ON,
 )
@@ -33,22 +34,31 @@ from .const import (
     CONF_ZONES,
     CONF_SOURCES,
     CONF_HAL_NAME,
-    HAL_ZONES,
-    HAL_SOURCES,
+    CONF_HAL_OPTIMISTIC,
+    DEFAULT_OPTIMISTIC,
     HAL_ON,
     HAL_OFF,
     HAL_MUTED,
     HAL_NOT_MUTED,
     HAL_SCAN_INTERVAL,
     HAL_MODULE,
+    HAL_SCHEDULER,
+    HAL_COORDINATOR,
+    HAL_SOURCE_MAP,
+    HAL_ATTR_POWER,
+    HAL_ATTR_SOURCE,
+    HAL_ATTR_VOLUME,
+    HAL_ATTR_MUTE,
+    SIGNAL_HAL_OPTIONS_UPDATED,
 )
+from . import entry_config, valid_zones
+from .client import quantize_volume
+from .entity import HALEntity
 
 # CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
 
 from homeassistant.components.media_player import PLATFORM_SCHEMA, MediaPlayerEntity, MediaPlayerEntityFeature
 
-PLATFORMS = ["media_player"]
-
 SUPPORT_HAL = (
     MediaPlayerEntityFeature.VOLUME_MUTE |
     MediaPlayerEntityFeature.VOLUME_SET |
@@ -67,75 +77,80 @@ async def async_setup(hass: HomeAssistant, config: dict):
     return True
 
 
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Unload a config entry."""
-    _LOGGER.debug(f"async_unload_entry: media_player entry {entry}")
-    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
-    if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
-
-    return unload_ok
-
-
 async def async_setup_entry(hass, config, async_add_entities):
     """Set up the HAL CA1006 platform."""
 
-    _LOGGER.debug(f"async_setup_platform: config {config}")
-    _LOGGER.debug(f"async_setup_platform: config data {config.data}")
-
-    hal = hass.data[DOMAIN][config.entry_id]
-
-    # Determine sources and zones
-    valid_zones = {}
-    for i in range(1, HAL_ZONES + 1):
-        _LOGGER.debug(f"async_setup_platform: Checking if zone {i} should de defined.")
-        if config.data[f"zone_{i}_valid"]:
-            _LOGGER.debug(f"Yes it is!")
-            valid_zones[f"{i}"] = config.data[f"zone_{i}"]
-        else:
-            _LOGGER.debug(f"No it isn't!")
-    _LOGGER.debug(f"async_setup_platform: valid_zones {valid_zones}.")
-
-    valid_sources = {}
-    source_list = []
-    for i in range(1, HAL_SOURCES + 1):
-        _LOGGER.debug(
-            f"async_setup_platform: Checking if source {i} should de defined."
-        )
-        if config.data[f"source_{i}_valid"]:
-            _LOGGER.debug(f"Yes it is!")
-            valid_sources[i] = config.data[f"source_{i}"]
-            source_list.append(config.data[f"source_{i}"])
-        else:
-            _LOGGER.debug(f"No it isn't!")
-    _LOGGER.debug(f"async_setup_platform: valid_sources {valid_sources}.")
-    _LOGGER.debug(f"async_setup_platform: source_list {source_list}.")
+    unit = hass.data[DOMAIN][config.entry_id]
+    hal_name = config.data[CONF_HAL_NAME]
+    devices = {}  # zone_id -> HALZoneDevice
+
+    def zone_names(conf):
+        """Return the names of the valid zones, by zone id."""
+        return {zone_id: conf[f"zone_{zone_id}"] for zone_id in valid_zones(conf)}
+
+    conf = entry_config(config)
+    _LOGGER.debug(
+        "%s: Setting up zones %s with sources %s.",
+        hal_name,
+        zone_names(conf),
+        unit[HAL_SOURCE_MAP].source_list,
+    )
+
+    def create_devices(conf):
+        """Create the entities of the valid zones that have none yet."""
+        new_devices = []
+        for zone_id, name in zone_names(conf).items():
+            if zone_id in devices:
+                continue
+            devices[zone_id] = HALZoneDevice(
+                hass,
+                unit[HAL_SCHEDULER],
+                unit[HAL_COORDINATOR],
+                hal_name,
+                zone_id,
+                name,
+                unit[HAL_SOURCE_MAP],
+                conf.get(CONF_HAL_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+            )
+            new_devices.append(devices[zone_id])
+        return new_devices
+
+    @callback
+    def async_options_updated():
+        """Add, remove and update the zone entities to match the options."""
+        conf = entry_config(config)
+        names = zone_names(conf)
+        entity_registry = er.async_get(hass)
+        device_registry = dr.async_get(hass)
+        for zone_id in [zone_id for zone_id in devices if zone_id not in names]:
+            device = devices.pop(zone_id)
+            _LOGGER.debug("%s: Removing zone %s.", hal_name, zone_id)
+            if device.entity_id in entity_registry.entities:
+                entity_registry.async_remove(device.entity_id)
+            else:
+                hass.async_create_task(device.async_remove())
+            zone_device = device_registry.async_get_device(
+                identifiers={(DOMAIN, device.unique_id)}
+            )
+            if zone_device is not None:
+                device_registry.async_remove_device(zone_device.id)
+        for zone_id, device in devices.items():
+            device.async_update_config(
+                names[zone_id],
+                unit[HAL_SOURCE_MAP],
+                conf.get(CONF_HAL_OPTIMISTIC, DEFAULT_OPTIMISTIC),
+            )
+        async_add_entities(create_devices(conf))
 
-    devices = []
-    for zone_id, name in valid_zones.items():
-        _LOGGER.debug(
-            f"async_setup_platform: "
-            f"{config.data[CONF_HAL_NAME]} zone id {zone_id} has name {name}."
-        )
-        dev = HALZoneDevice(
+    config.async_on_unload(
+        async_dispatcher_connect(
             hass,
-            hal,
-            config.data[CONF_HAL_NAME],
-            zone_id,
-            name,
-            valid_sources,
-            source_list,
+            SIGNAL_HAL_OPTIONS_UPDATED.format(config.entry_id),
+            async_options_updated,
         )
-        devices.append(dev)
-
-    # @callback
-    # async def async_on_stop(event):
-    #     """Shutdown cleanly when hass stops."""
-    #     await hass.async_add_executor_job(hal.disconnect)
-
-    # hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_on_stop)
+    )
 
-    async_add_entities(devices, True)
+    async_add_entities(create_devices(conf))
 
 
 # class HALDevice(Entity):
@@ -146,7 +161,7 @@ async def async_setup_entry(hass, config, async_add_entities):
 #     def __init__(self, hass, hal, hal_name, scan_interval):
 #         """Initialize the HAL CA1006 device."""
 #         self._hass = hass
-#         self._hal = hal
+#         self._scheduler = scheduler
 #         self._hal_name = hal_name
 #         self._scan_interval = scan_interval
 #         _LOGGER.debug(
@@ -172,23 +187,39 @@ async def async_setup_entry(hass, config, async_add_entities):
 #         return self._hal_name
 
 
-class HALZoneDevice(MediaPlayerEntity):
+class HALZoneDevice(HALEntity, MediaPlayerEntity):
     """Representation of a HAL Zone."""
 
-    def __init__(self, hass, hal, hal_name, zone_id, name, sources, source_list):
-        """Initialize the zone device."""
-        super().__init__()
+    def __init__(
+        self,
+        hass,
+        scheduler,
+        coordinator,
+        hal_name,
+        zone_id,
+        name,
+        sources,
+        optimistic=DEFAULT_OPTIMISTIC,
+    ):
+        """Initialize the zone device.
+
+        sources is the SourceMap of the unit, shared by all its zones.
+        """
+        super().__init__(coordinator, hal_name)
         self._hass = hass
-        self._hal_name = hal_name
         self._name = name
-        self._hal = hal
+        self._scheduler = scheduler
         self._zone_id = zone_id
         self._unique_id = hal_name + "." + str(zone_id)
         self._sources = sources
-        self._source_list = source_list
+        self._zone_state = coordinator.data.get(zone_id)
+        self._available = (
+            coordinator.last_update_success and self._zone_state is not None
+        )
+        self._optimistic = optimistic
+        self._commands_in_flight = 0
         _LOGGER.debug(
-            f"HALZoneDevice: Instantianating HALZoneDevice {self._hal_name}, "
-            f"zone {self._zone_id} ({self._name})."
+            "%s: Creating zone %s (%s).", self._hal_name, self._zone_id, self._name
         )
 
     @property
@@ -204,33 +235,68 @@ class HALZoneDevice(MediaPlayerEntity):
     @property
     def name(self):
         """Return the name of the zone."""
-        _LOGGER.debug(f"name: {self._name}")
         return self._name
 
     @property
     def unique_id(self):
         """Return a unique ID."""
-        _LOGGER.debug(f"unique_id: {self._unique_id}")
         return self._unique_id
 
     @property
     def device_id(self):
         """Return a device ID."""
-        _LOGGER.debug(f"device_id: {self._unique_id}")
         return self._unique_id
 
+    @property
+    def available(self):
+        """Return True if the coordinator has state for this zone."""
+        return self._available
+
+    @callback
+    def async_update_config(self, name, sources, optimistic):
+        """Apply changed options to the zone, renaming its device if needed."""
+        if name != self._name:
+            self._name = name
+            device_registry = dr.async_get(self.hass)
+            device = device_registry.async_get_device(
+                identifiers={(DOMAIN, self._unique_id)}
+            )
+            if device is not None:
+                device_registry.async_update_device(device.id, name=name)
+        self._sources = sources
+        self._optimistic = optimistic
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Take a new snapshot and write the state only if this zone has changed."""
+        if self._commands_in_flight:
+            # Keep showing the optimistic state until the commands are confirmed
+            return
+        zone_state = self.coordinator.data.get(self._zone_id)
+        available = self.coordinator.last_update_success and zone_state is not None
+        if zone_state == self._zone_state and available == self._available:
+            return
+        self._zone_state = zone_state
+        self._available = available
+        self.async_write_ha_state()
+
     @property
     def state(self):
         """Return the state of the device."""
-        _LOGGER.debug(f"HALZoneDevice.state")
-        power = self._hal.get_power(self._zone_id)
-        _LOGGER.debug(f"HALZoneDevice.state: power = {power}")
-        if power == HAL_ON:
-            _LOGGER.debug(f"HALZoneDevice.state is on")
+        if self._zone_state is None:
+            # The zone has not been read yet
+            return None
+        if self._zone_state.power:
             return STATE_ON
-        else:
-            _LOGGER.debug(f"HALZoneDevice.state is off")
-            return STATE_OFF
+        return STATE_OFF
+
+    @property
+    def extra_state_attributes(self):
+        """Flag a state that was saved before a restart and not yet read."""
+        if self._zone_state is not None and self._zone_state.restored:
+            return {"restored": True}
+        return None
 
     @property
     def supported_features(self):
@@ -240,24 +306,17 @@ class HALZoneDevice(MediaPlayerEntity):
     @property
     def source(self):
         """Get the currently selected source."""
-        source = self._hal.get_source(self._zone_id)
-        _LOGGER.debug(f"HALZoneDevice.source: source = {source}")
-        return self._sources[int(source)]
+        return self._sources.name(self._zone_state.source)
 
     @property
     def source_list(self):
         """Return a list of available input sources."""
-        _LOGGER.debug(f"HALZoneDevice.source_list: source_list = {self._source_list}")
-        return self._source_list
+        return self._sources.source_list
 
     @property
     def volume_level(self):
-        """Volume level of the media player (0..1).
-
-        Value is returned based on a range (0..100).
-        Therefore float divide by 100 to get to the required range.
-        """
-        return float(self._hal.get_volume(self._zone_id)) / 100.0
+        """Volume level of the media player (0..1)."""
+        return self._zone_state.volume
 
     @property
     def device_class(self):
@@ -265,45 +324,80 @@ class HALZoneDevice(MediaPlayerEntity):
 
     @property
     def is_volume_muted(self):
-        if self._hal.get_mute(self._zone_id) == HAL_MUTED:
-            return True
-        return False
+        return self._zone_state.muted
+
+    async def _async_command(self, attr, value, **expected):
+        """Send a command to the zone.
+
+        In optimistic mode the expected state is written immediately, then
+        confirmed by reading the zone back once the command has been sent.
+        If the HAL disagrees, the state is rolled back to what it reported.
+        """
+        if not self._optimistic or self._zone_state is None:
+            await self._scheduler.async_command(self._zone_id, attr, value)
+            self.coordinator.async_update_zone(self._zone_id)
+            return
+
+        self._commands_in_flight += 1
+        try:
+            self._zone_state = replace(self._zone_state, **expected)
+            self.async_write_ha_state()
+            applied = await self._scheduler.async_command(self._zone_id, attr, value)
+            if applied is not None and applied != value:
+                # Superseded by a newer command, which will confirm the state
+                return
+            if self._commands_in_flight == 1:
+                await self._scheduler.async_query(self._zone_id)
+        finally:
+            self._commands_in_flight -= 1
+
+        if self._commands_in_flight:
+            return
+        self.coordinator.async_update_zone(self._zone_id)
+        confirmed = self.coordinator.data.get(self._zone_id)
+        if confirmed is None or confirmed.restored:
+            # Not read back yet; the fast polls that follow will confirm it
+            return
+        for field, expected_value in expected.items():
+            if getattr(confirmed, field) != expected_value:
+                _LOGGER.warning(
+                    "%s zone %s: Expected %s %s but the HAL reported %s. "
+                    "Rolling back.",
+                    self._hal_name,
+                    self._zone_id,
+                    field,
+                    expected_value,
+                    getattr(confirmed, field),
+                )
+        self._handle_coordinator_update()
 
     async def async_turn_off(self):
         """Turn off the zone."""
-        await self._hass.async_add_executor_job(
-            self._hal.set_power, self._zone_id, HAL_OFF
-        )
+        await self._async_command(HAL_ATTR_POWER, HAL_OFF, power=False)
 
     async def async_turn_on(self):
         """Turn on the zone."""
-        await self._hass.async_add_executor_job(
-            self._hal.set_power, self._zone_id, HAL_ON
-        )
+        await self._async_command(HAL_ATTR_POWER, HAL_ON, power=True)
 
     async def async_set_volume_level(self, volume):
         """Set the volume level."""
         rvol = int(volume * 100.0)
-        await self._hass.async_add_executor_job(
-            self._hal.set_volume, self._zone_id, rvol
+        await self._async_command(
+            HAL_ATTR_VOLUME, rvol, volume=quantize_volume(rvol) / 100.0
         )
 
     async def async_select_source(self, source):
         """Select the source input for this zone."""
         _LOGGER.debug(
-            f"HALZoneDevice.async_select_source: "
-            f"source = {source}, self._sources = {self._sources}"
+            "%s zone %s: Selecting source %s.", self._hal_name, self._zone_id, source
         )
-        for source_id, name in self._sources.items():
-            if name.lower() != source.lower():
-                continue
-            await self._hass.async_add_executor_job(
-                self._hal.set_source, self._zone_id, source_id
+        source_id = self._sources.lookup(source)
+        if source_id is None:
+            _LOGGER.warning(
+                "%s zone %s: Unknown source %s.", self._hal_name, self._zone_id, source
             )
-            break
-
-    async def async_update(self):
-        await self._hass.async_add_executor_job(self._hal.get_zone_info, self._zone_id)
+            return
+        await self._async_command(HAL_ATTR_SOURCE, source_id, source=source_id)
 
     async def async_mute_volume(self, mute):
         """Mute the volume."""
@@ -311,6 +405,4 @@ class HALZoneDevice(MediaPlayerEntity):
             hal_mute = HAL_MUTED
         else:
             hal_mute = HAL_NOT_MUTED
-        await self.hass.async_add_executor_job(
-            self._hal.set_mute, self._zone_id, hal_mute
-        )
+        await self._async_command(HAL_ATTR_MUTE, hal_mute, muted=bool(mute))
@@ -0,0 +1,81 @@
+"""Data models for the HAL CA1006 multi-zone amplifier integration."""
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+from .const import HAL_MUTED, HAL_ON, HAL_SOURCES
+
+
+@dataclass(frozen=True, slots=True)
+class ZoneState:
+    """Immutable snapshot of the state of one HAL zone.
+
+    Values are decoded once when the snapshot is taken, so that entity
+    properties are plain attribute reads. A restored snapshot was saved
+    before Home Assistant restarted, and the zone has not been read since.
+    """
+
+    power: bool
+    source: int
+    volume: float  # 0..1
+    muted: bool
+    restored: bool = False
+
+    @classmethod
+    def from_hal(cls, power, source, volume, mute):
+        """Build a snapshot from the raw strings cached by a HAL client.
+
+        volume is given in the range 0..100, as returned by get_volume().
+        """
+        return cls(
+            power=power == HAL_ON,
+            source=int(source),
+            volume=int(volume) / 100.0,
+            muted=mute == HAL_MUTED,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class SourceMap:
+    """Immutable lookup tables between the source ids and names of a HAL unit.
+
+    Built once per config entry and shared by all zones of the unit. Units
+    with the same sources share the same tables.
+    """
+
+    names: Mapping[int, str]  # source id -> name
+    ids: Mapping[str, int]  # case-folded name -> source id
+    source_list: tuple[str, ...]
+
+    @classmethod
+    def from_config(cls, data):
+        """Build the tables for the valid sources of a config entry."""
+        return _source_map(
+            tuple(
+                (i, data[f"source_{i}"])
+                for i in range(1, HAL_SOURCES + 1)
+                if data[f"source_{i}_valid"]
+            )
+        )
+
+    def name(self, source_id):
+        """Return the name of a source, or None if it is not a valid source."""
+        return self.names.get(source_id)
+
+    def lookup(self, source):
+        """Return the id of a source given by name or number, or None if unknown."""
+        source_id = self.ids.get(source.casefold())
+        if source_id is None and source.isdigit() and int(source) in self.names:
+            source_id = int(source)
+        return source_id
+
+
+@lru_cache(maxsize=16)
+def _source_map(sources):
+    """Return the SourceMap of a tuple of (id, name) pairs."""
+    return SourceMap(
+        names=MappingProxyType(dict(sources)),
+        ids=MappingProxyType({name.casefold(): i for i, name in sources}),
+        source_list=tuple(name for _, name in sources),
+    )
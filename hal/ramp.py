@@ -0,0 +1,43 @@
+"""Volume ramps for the zones of a HAL CA1006 unit.
+
+A ramp moves the volume of a zone from its current level to a target over a
+given time, following a curve. The HAL only has HAL_MAX_VOL volume steps, so
+a ramp is planned as one command per step, sent at the moment the curve
+reaches that step. Ramps are run by the command scheduler of the unit.
+"""
+import math
+
+from .client import HAL_MAX_VOL, step_volume, volume_step
+
+RAMP_LINEAR = "linear"
+RAMP_EASE_IN = "ease_in"
+RAMP_EASE_OUT = "ease_out"
+
+# Fraction of the duration at which a curve has made a fraction of the change:
+# ease in starts slowly and speeds up, ease out starts fast and slows down.
+RAMP_CURVES = {
+    RAMP_LINEAR: lambda fraction: fraction,
+    RAMP_EASE_IN: math.sqrt,
+    RAMP_EASE_OUT: lambda fraction: 1 - math.sqrt(1 - fraction),
+}
+
+
+def ramp_steps(start, target, duration, curve=RAMP_LINEAR):
+    """Return the (seconds from the start, volume [0..100]) of each ramp step.
+
+    start is the current volume as reported by the HAL and target the volume
+    to end at, both in the range 0..100. The last step is sent at duration.
+    """
+    first = volume_step(start)
+    last = int(target) * HAL_MAX_VOL // 100
+    count = abs(last - first)
+    if not count:
+        return []
+    direction = 1 if last > first else -1
+    time_of = RAMP_CURVES[curve]
+    return [
+        (duration * time_of(i / count), step_volume(step))
+        for i, step in enumerate(
+            range(first + direction, last + direction, direction), start=1
+        )
+    ]
@@ -0,0 +1,146 @@
+"""Runtime shared by all HAL units of a Home Assistant instance.
+
+Each unit keeps its own client, command scheduler and coordinator in
+hass.data[DOMAIN][entry_id]. The shared runtime decides when each unit is
+polled, spreading the polls of all units evenly over the poll interval
+instead of letting every unit poll at the same moment, and bounds the number
+of requests in flight to all units at any time. Connects have a separate,
+wider bound, so that units being set up or reconnected do not queue behind
+the polls of the others. The runtime also holds the connection opened by the
+config flow to probe a new unit until the unit is set up.
+"""
+import asyncio
+import logging
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+
+from .const import (
+    DOMAIN,
+    HAL_MAX_CONCURRENT_CONNECTS,
+    HAL_MAX_CONCURRENT_IO,
+    HAL_RUNTIME,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Successive units are offset by the golden ratio of the poll interval, which
+# keeps the polls of any number of units evenly spread.
+_GOLDEN_RATIO = 0.6180339887498949
+
+
+@callback
+def async_get_runtime(hass: HomeAssistant):
+    """Return the runtime shared by all HAL units, creating it if needed.
+
+    A config flow can run before the integration has been set up.
+    """
+    data = hass.data.setdefault(DOMAIN, {})
+    if HAL_RUNTIME not in data:
+        runtime = data[HAL_RUNTIME] = HALRuntime(hass)
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, runtime.async_on_stop)
+    return data[HAL_RUNTIME]
+
+
+class HALRuntime:
+    """Poll schedule and I/O limits shared by all HAL units."""
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the runtime."""
+        self._hass = hass
+        self.io_slots = asyncio.Semaphore(HAL_MAX_CONCURRENT_IO)
+        self.connect_slots = asyncio.Semaphore(HAL_MAX_CONCURRENT_CONNECTS)
+        self._polls = {}  # coordinator -> handle of its next poll
+        self._polling = {}  # coordinator -> task of its poll in progress
+        self._units_added = 0
+        self._epoch = hass.loop.time()
+        self._probes = {}  # (host, port, legacy) -> connected client
+
+    @callback
+    def async_keep_probe(self, host, port, legacy, hal):
+        """Keep the connected client of a config flow for the entry setup."""
+        self.async_discard_probe(host, port, legacy)
+        self._probes[(host, port, legacy)] = hal
+
+    @callback
+    def async_take_probe(self, host, port, legacy):
+        """Return the kept client for a unit, if it is still connected."""
+        hal = self._probes.pop((host, port, legacy), None)
+        if hal is not None and not hal.is_connected():
+            return None
+        return hal
+
+    @callback
+    def async_discard_probe(self, host, port, legacy):
+        """Disconnect a kept client that is not going to be used."""
+        hal = self._probes.pop((host, port, legacy), None)
+        if hal is not None:
+            self._hass.async_create_background_task(
+                hal.async_disconnect(), f"{DOMAIN} {host}:{port} probe disconnect"
+            )
+
+    async def async_on_stop(self, event: Event):
+        """Disconnect the kept clients when Home Assistant stops."""
+        probes, self._probes = self._probes, {}
+        await asyncio.gather(*(hal.async_disconnect() for hal in probes.values()))
+
+    @callback
+    def async_add_unit(self, coordinator, poll_now=False):
+        """Start polling a unit, out of phase with the units already polled.
+
+        Each unit is polled at a fixed phase of its poll interval, counted
+        from when the runtime was created. With poll_now, the unit is also
+        polled once straight away, before settling into its phase.
+        """
+        phase = (self._units_added * _GOLDEN_RATIO) % 1
+        self._units_added += 1
+        interval = coordinator.poll_interval
+        due = self._next_due(self._epoch + phase * interval, interval)
+        if poll_now:
+            self._polls[coordinator] = self._hass.loop.call_soon(
+                self._poll, coordinator, due - interval
+            )
+        else:
+            self._schedule(coordinator, due)
+
+    @callback
+    def async_remove_unit(self, coordinator):
+        """Stop polling a unit, cancelling a poll that is in progress."""
+        handle = self._polls.pop(coordinator, None)
+        if handle is not None:
+            handle.cancel()
+        task = self._polling.pop(coordinator, None)
+        if task is not None:
+            task.cancel()
+
+    @callback
+    def _schedule(self, coordinator, when):
+        """Schedule the next poll of a unit."""
+        self._polls[coordinator] = self._hass.loop.call_at(
+            when, self._poll, coordinator, when
+        )
+
+    @callback
+    def _poll(self, coordinator, due):
+        """Start polling a unit that is due."""
+        self._polling[coordinator] = self._hass.async_create_background_task(
+            self._async_poll(coordinator, due), f"{DOMAIN} {coordinator.name} poll"
+        )
+
+    async def _async_poll(self, coordinator, due):
+        """Poll a unit and schedule its next poll in the same phase."""
+        try:
+            await coordinator.async_refresh()
+        finally:
+            self._polling.pop(coordinator, None)
+        if coordinator not in self._polls:
+            return
+        # If the poll overran its interval, the missed polls are skipped
+        self._schedule(coordinator, self._next_due(due, coordinator.poll_interval))
+
+    def _next_due(self, due, interval):
+        """Return the first time after now that is a whole interval after due."""
+        now = self._hass.loop.time()
+        if due > now:
+            return due
+        return due + ((now - due) // interval + 1) * interval
@@ -0,0 +1,380 @@
+"""Command scheduler for a HAL CA1006 unit.
+
+All traffic to a HAL unit goes through one scheduler, which sends a single
+request at a time. Commands are queued per zone and attribute, and a newer
+command for the same zone and attribute replaces one that has not been sent
+yet, so that dragging a volume slider sends only the latest volume. A node
+status command sets all attributes of a zone at once: it takes over the queued
+commands for the attributes of its zone, and a command for one attribute of a
+zone that has a node status command queued is merged into it, so the latest
+value of each attribute is the one sent. Queued commands are always sent
+before background zone queries.
+
+Commands that fail because the connection is down are remembered, so that
+the last desired state can be replayed once the connection is restored.
+
+Every request takes one of the I/O slots shared by all units, which bounds
+the number of requests in flight across all HAL units. The time each request
+waited in the queue and took to complete is recorded in the client's stats.
+
+Volume ramps are run by the scheduler too. A ramp sends one volume command
+per step of the HAL, skipping steps that are already overdue when the link
+falls behind, and any newer command for the zone cancels it.
+
+When the unit is unloaded, the scheduler is shut down: queued queries are
+dropped, and queued commands are sent only while a deadline allows.
+"""
+import asyncio
+from collections import deque
+import logging
+
+from .const import (
+    HAL_ATTR_MUTE,
+    HAL_ATTR_POWER,
+    HAL_ATTR_SOURCE,
+    HAL_ATTR_STATUS,
+    HAL_ATTR_VOLUME,
+    HAL_OFF,
+)
+from .ramp import ramp_steps
+
+_LOGGER = logging.getLogger(__name__)
+
+HAL_ALL_ZONES = "all"
+
+# The attributes set by a node status command, in the order of its value
+_STATUS_FIELDS = (HAL_ATTR_POWER, HAL_ATTR_SOURCE, HAL_ATTR_VOLUME, HAL_ATTR_MUTE)
+
+
+class _Command:
+    """A queued command and the callers waiting for its result.
+
+    futures holds (future, index) pairs. index is None for callers waiting
+    for the value of the command, or the position in the value of a node
+    status command of the attribute set by a command merged into it.
+    """
+
+    __slots__ = ("zone", "attr", "value", "futures", "submitted")
+
+    def __init__(self, zone, attr, value, submitted):
+        """Initialize the command."""
+        self.zone = zone
+        self.attr = attr
+        self.value = value
+        self.futures = []
+        self.submitted = submitted
+
+
+class HALCommandScheduler:
+    """Serialize, coalesce and prioritize the traffic to one HAL unit."""
+
+    def __init__(self, hal, name="", io_slots=None):
+        """Initialize the scheduler for the given HAL client.
+
+        io_slots is a semaphore shared with the schedulers of other units.
+        """
+        self.hal = hal
+        self._name = name
+        self._io_slots = io_slots or asyncio.Semaphore()
+        self._commands = {}  # (zone, attr) -> _Command, in submission order
+        self._queries = deque()  # (type, coroutine function, args, future, time)
+        self._failed = {}  # (zone, attr) -> value, while disconnected
+        self._sending = None  # the command being sent, if any
+        self._ramps = {}  # zone -> task of its volume ramp
+        self._closed = False
+        self._task = None
+
+    @property
+    def queue_depth(self):
+        """Return the number of commands and queries waiting to be sent."""
+        return len(self._commands) + len(self._queries)
+
+    async def async_command(self, zone, attr, value):
+        """Queue a command and wait until it has been sent.
+
+        If a newer command for the same zone and attribute is submitted before
+        this one is sent, only the newer value is sent. A volume ramp of the
+        zone (of any zone, when turning all zones off) is cancelled. Returns
+        the value that was finally applied, or None if the HAL did not
+        confirm the command or the scheduler has been shut down.
+        """
+        for ramp_zone in list(self._ramps):
+            if zone in (ramp_zone, HAL_ALL_ZONES):
+                self._ramps.pop(ramp_zone).cancel()
+        return await self._async_submit(zone, attr, value)
+
+    async def _async_submit(self, zone, attr, value):
+        """Queue a command, replacing a queued one, and wait until it is sent."""
+        if self._closed:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        status = self._commands.get((zone, HAL_ATTR_STATUS))
+        if status is not None and attr in _STATUS_FIELDS:
+            index = _STATUS_FIELDS.index(attr)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(
+                    "%s: Zone %s %s %s merged into the queued node status",
+                    self._name,
+                    zone,
+                    attr,
+                    value,
+                )
+            status.value = status.value[:index] + (value,) + status.value[index + 1 :]
+            status.futures.append((future, index))
+            self.hal.stats.count("coalesced")
+            self._ensure_running()
+            return await future
+
+        key = (zone, attr)
+        command = self._commands.get(key)
+        if command is None:
+            command = self._commands[key] = _Command(zone, attr, value, loop.time())
+        else:
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(
+                    "%s: Zone %s %s %s replaced by %s",
+                    self._name,
+                    zone,
+                    attr,
+                    command.value,
+                    value,
+                )
+            command.value = value
+            self.hal.stats.count("coalesced")
+        if attr == HAL_ATTR_STATUS:
+            # Superseded by the node status, whose value is sent instead
+            for index, field in enumerate(_STATUS_FIELDS):
+                replaced = self._commands.pop((zone, field), None)
+                if replaced is not None:
+                    command.futures.extend(
+                        (replaced_future, index)
+                        for replaced_future, _ in replaced.futures
+                    )
+                    self.hal.stats.count("coalesced")
+        command.futures.append((future, None))
+        self._ensure_running()
+        return await future
+
+    async def async_turn_off(self):
+        """Queue turning off all zones and wait until it has been sent."""
+        return await self.async_command(HAL_ALL_ZONES, HAL_ATTR_POWER, HAL_OFF)
+
+    async def async_set_zone(self, zone, power, source, volume, mute):
+        """Queue setting all attributes of a zone in a single command."""
+        return await self.async_command(
+            zone, HAL_ATTR_STATUS, (power, source, volume, mute)
+        )
+
+    async def async_ramp_volume(self, zone, start, target, duration, curve):
+        """Ramp the volume of a zone and wait until the ramp ends.
+
+        start is the current volume of the zone and target the volume to end
+        at, both in the range 0..100. Returns True if the target was reached,
+        or False if the ramp failed or was cancelled by a newer command.
+        """
+        task = self._ramps.pop(zone, None)
+        if task is not None:
+            task.cancel()
+        task = asyncio.get_running_loop().create_task(
+            self._async_ramp(zone, ramp_steps(start, target, duration, curve))
+        )
+        self._ramps[zone] = task
+        try:
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self._ramps.get(zone) is task:
+                del self._ramps[zone]
+        return not task.cancelled() and task.result()
+
+    async def _async_ramp(self, zone, steps):
+        """Send the steps of a volume ramp, each at its time.
+
+        A step is skipped if the next one is already due, so that a ramp
+        faster than the link only sends the steps the link can carry.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for index, (offset, volume) in enumerate(steps):
+            delay = start + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif index + 1 < len(steps) and start + steps[index + 1][0] <= loop.time():
+                self.hal.stats.count("ramp_steps_skipped")
+                continue
+            if await self._async_submit(zone, HAL_ATTR_VOLUME, volume) is None:
+                return False
+        return True
+
+    async def async_query(self, zone):
+        """Read the state of a zone once no commands are waiting to be sent."""
+        return await self._async_request("query", self.hal.async_get_zone_info, zone)
+
+    async def async_ping(self):
+        """Check that the HAL answers once no commands are waiting to be sent."""
+        return await self._async_request("ping", self.hal.async_ping)
+
+    async def _async_request(self, request_type, request, *args):
+        """Queue a background request behind any commands and wait for it."""
+        if self._closed:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queries.append((request_type, request, args, future, loop.time()))
+        self._ensure_running()
+        return await future
+
+    async def async_replay(self):
+        """Resend the commands that failed while the HAL was disconnected.
+
+        Only the last value per zone and attribute is sent, and not if a newer
+        command for the same zone and attribute is already queued. A node
+        status is sent with the values of the newer commands queued for its
+        attributes.
+        """
+        failed, self._failed = self._failed, {}
+        replays = []
+        for (zone, attr), value in failed.items():
+            if (zone, attr) in self._commands:
+                continue
+            if attr in _STATUS_FIELDS and (zone, HAL_ATTR_STATUS) in self._commands:
+                continue
+            if attr == HAL_ATTR_STATUS:
+                value = tuple(
+                    self._commands[(zone, field)].value
+                    if (zone, field) in self._commands
+                    else field_value
+                    for field, field_value in zip(_STATUS_FIELDS, value)
+                )
+            replays.append(self._async_submit(zone, attr, value))
+        await asyncio.gather(*replays)
+
+    async def async_shutdown(self, timeout):
+        """Stop sending, after sending the queued commands within timeout.
+
+        Queued queries are dropped at once, and so is a query in flight if no
+        command is waiting. Commands that cannot be sent in time are dropped,
+        and their callers get None.
+        """
+        self._closed = True
+        self._failed.clear()
+        for task in self._ramps.values():
+            task.cancel()
+        self._ramps.clear()
+        while self._queries:
+            future = self._queries.popleft()[3]
+            future.cancel()
+        task = self._task
+        if task is not None and not task.done():
+            if self._commands or self._sending is not None:
+                try:
+                    await asyncio.wait_for(asyncio.shield(task), timeout)
+                except asyncio.TimeoutError:
+                    _LOGGER.warning(
+                        "%s: Timeout sending queued commands, dropping %s.",
+                        self._name,
+                        len(self._commands) + (self._sending is not None),
+                    )
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        commands = list(self._commands.values())
+        if self._sending is not None:
+            commands.append(self._sending)
+            self._sending = None
+        self._commands.clear()
+        for command in commands:
+            for future, _ in command.futures:
+                if not future.done():
+                    future.set_result(None)
+
+    def _ensure_running(self):
+        """Start the worker if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._async_run())
+
+    async def _async_run(self):
+        """Send queued commands, then queued queries, until both are empty."""
+        while self._commands or self._queries:
+            # Wait for an I/O slot before picking the next request, so that
+            # commands submitted meanwhile still replace queued ones.
+            async with self._io_slots:
+                await self._async_send_next()
+
+    async def _async_send_next(self):
+        """Send the first queued command, or else the first queued query."""
+        stats = self.hal.stats
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self._commands:
+            key = next(iter(self._commands))
+            command = self._commands.pop(key)
+            stats.queue_wait.add(start - command.submitted)
+            self._sending = command
+            result = await self._async_send(command)
+            self._sending = None
+            stats.record(
+                "turn_off" if command.zone == HAL_ALL_ZONES else command.attr,
+                loop.time() - start,
+                result is not None,
+            )
+            if result is None and not self.hal.is_connected():
+                self._failed[key] = command.value
+            else:
+                self._failed.pop(key, None)
+            for future, index in command.futures:
+                if not future.done():
+                    future.set_result(
+                        result if result is None or index is None else result[index]
+                    )
+            return
+
+        if not self._queries:
+            return
+        request_type, request, args, future, submitted = self._queries.popleft()
+        if future.done():
+            return
+        stats.queue_wait.add(start - submitted)
+        try:
+            result = await request(*args)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            stats.record(request_type, loop.time() - start, False)
+            if not future.done():
+                future.set_exception(err)
+        else:
+            stats.record(request_type, loop.time() - start, bool(result))
+            if not future.done():
+                future.set_result(result)
+
+    async def _async_send(self, command):
+        """Send one command and return the applied value, or None on failure."""
+        hal = self.hal
+        try:
+            if command.zone == HAL_ALL_ZONES:
+                ok = await hal.async_turn_off()
+            elif command.attr == HAL_ATTR_POWER:
+                ok = await hal.async_set_power(command.zone, command.value)
+            elif command.attr == HAL_ATTR_SOURCE:
+                ok = await hal.async_set_source(command.zone, command.value)
+            elif command.attr == HAL_ATTR_VOLUME:
+                ok = await hal.async_set_volume(command.zone, command.value)
+            elif command.attr == HAL_ATTR_MUTE:
+                ok = await hal.async_set_mute(command.zone, command.value)
+            elif command.attr == HAL_ATTR_STATUS:
+                ok = await hal.async_set_node_status(command.zone, *command.value)
+            else:
+                raise ValueError(f"Unknown HAL attribute {command.attr}")
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception(
+                "%s: Error setting zone %s %s", self._name, command.zone, command.attr
+            )
+            ok = False
+        return command.value if ok else None
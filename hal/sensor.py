@@ -0,0 +1,139 @@
+"""Diagnostic sensors of a HAL CA1006 unit.
+
+The sensors show how the link to the HAL behaves: zone query times, queue
+depth and counts of requests, failures, timeouts and reconnects. They are
+disabled by default and can be enabled on the HAL unit device.
+"""
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+import logging
+
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    CONF_HAL_NAME,
+    HAL_COORDINATOR,
+    HAL_DIAGNOSTICS_SCAN_INTERVAL,
+    HAL_OBJECT,
+    HAL_SCHEDULER,
+)
+from .entity import HALEntity
+
+_LOGGER = logging.getLogger(__name__)
+
+# The counters change without coordinator updates, so the sensors are polled
+SCAN_INTERVAL = timedelta(seconds=HAL_DIAGNOSTICS_SCAN_INTERVAL)
+
+
+@dataclass(frozen=True, kw_only=True)
+class HALSensorEntityDescription(SensorEntityDescription):
+    """Describes a HAL diagnostic sensor."""
+
+    value_fn: Callable[[dict], float | int | None]
+
+
+SENSORS = (
+    HALSensorEntityDescription(
+        key="query_time",
+        name="Query time",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda unit: unit[HAL_OBJECT].stats.percentile("query", 0.5),
+    ),
+    HALSensorEntityDescription(
+        key="query_time_p95",
+        name="Query time (95th percentile)",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda unit: unit[HAL_OBJECT].stats.percentile("query", 0.95),
+    ),
+    HALSensorEntityDescription(
+        key="queue_depth",
+        name="Queue depth",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda unit: unit[HAL_SCHEDULER].queue_depth,
+    ),
+    HALSensorEntityDescription(
+        key="requests",
+        name="Requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda unit: unit[HAL_OBJECT].stats.counters["requests"],
+    ),
+    HALSensorEntityDescription(
+        key="failures",
+        name="Failed requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda unit: unit[HAL_OBJECT].stats.counters["failures"],
+    ),
+    HALSensorEntityDescription(
+        key="timeouts",
+        name="Timeouts",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda unit: unit[HAL_OBJECT].stats.counters["timeouts"],
+    ),
+    HALSensorEntityDescription(
+        key="reconnects",
+        name="Reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda unit: unit[HAL_OBJECT].stats.counters["reconnects"],
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, config: ConfigEntry, async_add_entities
+):
+    """Set up the diagnostic sensors of a HAL unit."""
+    unit = hass.data[DOMAIN][config.entry_id]
+    async_add_entities(
+        HALDiagnosticSensor(
+            unit,
+            config.data[CONF_HAL_NAME],
+            config.data.get("sw_version", "TBD"),
+            description,
+        )
+        for description in SENSORS
+    )
+
+
+class HALDiagnosticSensor(HALEntity, SensorEntity):
+    """A performance counter of a HAL unit."""
+
+    entity_description: HALSensorEntityDescription
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, unit, hal_name, version, description):
+        """Initialize the sensor."""
+        super().__init__(unit[HAL_COORDINATOR], hal_name, version)
+        self.entity_description = description
+        self._unit = unit
+        self._attr_name = f"{hal_name} {description.name}"
+        self._attr_unique_id = f"{hal_name}.{description.key}"
+
+    @property
+    def should_poll(self):
+        """Poll the sensor, as the counters change between coordinator updates."""
+        return True
+
+    @property
+    def available(self):
+        """Return True; the counters are available while disconnected too."""
+        return True
+
+    @property
+    def native_value(self):
+        """Return the current value of the counter."""
+        return self.entity_description.value_fn(self._unit)
+
+    async def async_update(self):
+        """Nothing to fetch; the value is read when the state is written."""
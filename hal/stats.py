@@ -0,0 +1,96 @@
+"""Performance counters for a HAL CA1006 unit.
+
+Every unit keeps counters of the traffic on its link (requests, failures,
+timeouts, reconnects, ...) and a rolling window of the latency of each type
+of request. They are exposed through the diagnostics download and the
+diagnostic sensors of the unit.
+"""
+from bisect import bisect_left
+from collections import Counter, deque
+
+from .const import HAL_STATS_WINDOW
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+HAL_LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+HAL_LATENCY_LABELS = tuple(f"le_{bucket}ms" for bucket in HAL_LATENCY_BUCKETS) + (
+    f"gt_{HAL_LATENCY_BUCKETS[-1]}ms",
+)
+
+
+class LatencyWindow:
+    """Latencies of the most recent requests of one type."""
+
+    def __init__(self, size=HAL_STATS_WINDOW):
+        """Initialize the window."""
+        self._samples = deque(maxlen=size)
+        self.count = 0
+        self.failures = 0
+
+    def add(self, seconds, ok=True):
+        """Add the latency of a request."""
+        self._samples.append(seconds * 1000)
+        self.count += 1
+        if not ok:
+            self.failures += 1
+
+    def percentile(self, fraction):
+        """Return the latency in ms below which fraction of the window falls."""
+        if not self._samples:
+            return None
+        samples = sorted(self._samples)
+        return round(samples[int(fraction * (len(samples) - 1))], 1)
+
+    def as_dict(self):
+        """Return a summary and histogram of the window."""
+        histogram = dict.fromkeys(HAL_LATENCY_LABELS, 0)
+        for sample in self._samples:
+            index = bisect_left(HAL_LATENCY_BUCKETS, sample)
+            histogram[HAL_LATENCY_LABELS[index]] += 1
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "window": len(self._samples),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(max(self._samples), 1) if self._samples else None,
+            "histogram": histogram,
+        }
+
+
+class HALStats:
+    """Counters and latencies of the traffic to one HAL unit."""
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.counters = Counter()
+        self.latency = {}  # request type -> LatencyWindow
+        self.queue_wait = LatencyWindow()  # from submission until sent
+
+    def count(self, name, increment=1):
+        """Increment a counter."""
+        self.counters[name] += increment
+
+    def record(self, request, seconds, ok=True):
+        """Record the latency and outcome of a request of the given type."""
+        window = self.latency.get(request)
+        if window is None:
+            window = self.latency[request] = LatencyWindow()
+        window.add(seconds, ok)
+        self.counters["requests"] += 1
+        if not ok:
+            self.counters["failures"] += 1
+
+    def percentile(self, request, fraction):
+        """Return a latency percentile in ms for a request type, if known."""
+        window = self.latency.get(request)
+        return window.percentile(fraction) if window is not None else None
+
+    def as_dict(self):
+        """Return all counters and latency summaries."""
+        return {
+            "counters": dict(self.counters),
+            "latency": {
+                request: window.as_dict() for request, window in self.latency.items()
+            },
+            "queue_wait": self.queue_wait.as_dict(),
+        }
@@ -0,0 +1,117 @@
+"""Zone state of a HAL CA1006 unit, kept across restarts.
+
+The zone state is saved to storage shortly after it changes. When Home
+Assistant starts, the zone entities show the saved state, flagged as
+restored, until a background refresh has read the zones again, so that
+startup does not wait for every zone of every unit to be polled.
+
+Snapshots of the zone state, taken and restored with the hal.snapshot and
+hal.restore services, are kept in memory and, if asked for, in storage.
+"""
+from dataclasses import asdict
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    HAL_STATE_SAVE_DELAY,
+    STORAGE_KEY,
+    STORAGE_KEY_SNAPSHOTS,
+    STORAGE_VERSION,
+)
+from .models import ZoneState
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HALStateStore:
+    """Saved zone state of one HAL unit."""
+
+    def __init__(self, hass: HomeAssistant, entry_id):
+        """Initialize the store of the config entry."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY.format(entry_id))
+
+    async def async_load(self, zones):
+        """Return the saved state of the given zones, flagged as restored.
+
+        Zones without a usable saved state are left out.
+        """
+        return _load_zones(await self._store.async_load(), zones, restored=True)
+
+    @callback
+    def async_save(self, data):
+        """Save the zone state, batching changes made in quick succession."""
+        self._store.async_delay_save(lambda: _dump_zones(data), HAL_STATE_SAVE_DELAY)
+
+    async def async_remove(self):
+        """Delete the saved state."""
+        await self._store.async_remove()
+
+
+class HALSnapshots:
+    """Named snapshots of the zone state of one HAL unit."""
+
+    def __init__(self, hass: HomeAssistant, entry_id):
+        """Initialize the snapshots of the config entry."""
+        self._store = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY_SNAPSHOTS.format(entry_id)
+        )
+        self._snapshots = {}  # name -> {zone_id: ZoneState}
+        self._persisted = set()  # names of the snapshots kept in storage
+
+    async def async_load(self):
+        """Load the snapshots kept in storage."""
+        stored = await self._store.async_load() or {}
+        for name, zones in stored.items():
+            self._snapshots[name] = _load_zones(zones, zones)
+            self._persisted.add(name)
+
+    def get(self, name):
+        """Return a snapshot by name, or None if there is none."""
+        return self._snapshots.get(name)
+
+    async def async_take(self, name, data, persist=False):
+        """Keep a snapshot of the zone state, in storage too if persist is set.
+
+        A snapshot replaces an earlier one of the same name.
+        """
+        self._snapshots[name] = dict(data)
+        if persist:
+            self._persisted.add(name)
+        elif name in self._persisted:
+            self._persisted.discard(name)
+        else:
+            return
+        await self._store.async_save(
+            {key: _dump_zones(self._snapshots[key]) for key in self._persisted}
+        )
+
+    async def async_remove(self):
+        """Delete the snapshots kept in storage."""
+        await self._store.async_remove()
+
+
+def _dump_zones(data):
+    """Return zone states, by zone id, in the form they are stored in."""
+    return {
+        zone_id: asdict(zone_state, dict_factory=_without_restored)
+        for zone_id, zone_state in data.items()
+    }
+
+
+def _load_zones(stored, zones, restored=False):
+    """Return the stored state of the given zones, leaving out unusable ones."""
+    stored = stored or {}
+    data = {}
+    for zone_id in zones:
+        try:
+            data[zone_id] = ZoneState(**stored[zone_id], restored=restored)
+        except (KeyError, TypeError):
+            continue
+    return data
+
+
+def _without_restored(fields):
+    """Return the stored fields of a ZoneState."""
+    return {name: value for name, value in fields if name != "restored"}
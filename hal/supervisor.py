@@ -0,0 +1,97 @@
+"""Connection supervisor for a HAL CA1006 unit.
+
+The supervisor checks the connection with a keepalive query every
+HAL_KEEPALIVE_INTERVAL seconds, and reconnects in the background with a
+jittered exponential backoff when the connection drops. Zone entities are marked
+unavailable while the HAL is disconnected.
+"""
+import asyncio
+import logging
+import random
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from .const import (
+    DOMAIN,
+    HAL_KEEPALIVE_INTERVAL,
+    HAL_RECONNECT_MAX_DELAY,
+    HAL_RECONNECT_MIN_DELAY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HALConnectionSupervisor:
+    """Keep the connection to a HAL unit alive."""
+
+    def __init__(
+        self, hass: HomeAssistant, hal, scheduler, coordinator, hal_name, connect_slots
+    ):
+        """Initialize the supervisor.
+
+        connect_slots is the semaphore bounding the connects to all HAL units,
+        which is taken for reconnecting.
+        """
+        self._hass = hass
+        self._hal = hal
+        self._scheduler = scheduler
+        self._coordinator = coordinator
+        self._hal_name = hal_name
+        self._connect_slots = connect_slots
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @callback
+    def async_start(self, entry: ConfigEntry):
+        """Start supervising the connection."""
+        self._hal.set_disconnect_listener(self._wakeup.set)
+        self._task = entry.async_create_background_task(
+            self._hass, self._async_run(), f"{DOMAIN} {self._hal_name} supervisor"
+        )
+
+    async def async_stop(self):
+        """Stop supervising the connection."""
+        self._hal.set_disconnect_listener(None)
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _async_run(self):
+        """Check the connection every keepalive interval or when it drops."""
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), HAL_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if self._hal.is_connected() and await self._scheduler.async_ping():
+                continue
+            await self._async_reconnect()
+
+    async def _async_reconnect(self):
+        """Reconnect with backoff, then restore the desired zone state."""
+        self._coordinator.async_set_update_error(
+            UpdateFailed(f"Lost connection to HAL unit {self._hal_name}")
+        )
+        delay = HAL_RECONNECT_MIN_DELAY
+        while True:
+            _LOGGER.warning("%s: Connection lost, reconnecting.", self._hal_name)
+            await self._hal.async_disconnect()
+            async with self._connect_slots:
+                connected = await self._hal.async_connect()
+            if connected:
+                break
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, HAL_RECONNECT_MAX_DELAY)
+
+        self._hal.stats.count("reconnects")
+        _LOGGER.info("%s: Reconnected.", self._hal_name)
+        await self._scheduler.async_replay()
+        await self._coordinator.async_refresh_all()
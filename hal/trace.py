@@ -0,0 +1,62 @@
+"""Trace of the protocol frames exchanged with a HAL CA1006 unit.
+
+Tracing is off by default and is switched on per unit with the
+hal.set_frame_trace service. While it is on, every frame sent to or received
+from the HAL is kept in a short history, included in the diagnostics
+download, and logged at debug level by custom_components.hal.trace.
+"""
+from collections import deque
+from datetime import datetime, timezone
+import logging
+
+from .const import HAL_TRACE_FRAMES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FrameTrace:
+    """History of the most recent frames of one HAL unit."""
+
+    def __init__(self, name="", size=HAL_TRACE_FRAMES):
+        """Initialize the trace, switched off."""
+        self._name = name
+        self.enabled = False
+        self.frames = deque(maxlen=size)
+
+    def set_enabled(self, enabled):
+        """Switch tracing on or off. Switching it on clears the history."""
+        if enabled and not self.enabled:
+            self.frames.clear()
+        self.enabled = enabled
+        _LOGGER.info(
+            "%s: Frame trace %s.", self._name, "enabled" if enabled else "disabled"
+        )
+
+    def record(self, direction, frame):
+        """Record a frame sent ("tx") or received ("rx").
+
+        Callers check enabled first, so nothing is formatted while tracing
+        is off.
+        """
+        text = frame.decode(errors="replace").strip()
+        if not text:
+            return
+        self.frames.append(
+            {
+                "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "direction": direction,
+                "frame": text,
+            }
+        )
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(
+                "%s %s %r",
+                self._name,
+                direction,
+                text,
+                extra={"hal_name": self._name, "direction": direction},
+            )
+
+    def as_dict(self):
+        """Return the trace state and history."""
+        return {"enabled": self.enabled, "frames": list(self.frames)}
@@ -0,0 +1,93 @@
+"""Helpers shared by the tests."""
+import contextlib
+import tempfile
+
+from homeassistant.core import HomeAssistant
+
+from hal.client import create_client
+from hal.coordinator import HALDataUpdateCoordinator
+from hal.media_player import HALZoneDevice
+from hal.models import SourceMap
+from hal.scheduler import HALCommandScheduler
+
+from hal_simulator import HALSimulator
+
+HAL_NAME = "Test"
+SOURCE_MAP = SourceMap.from_config(
+    {
+        **{f"source_{i}": f"Source {i}" for i in range(1, 9)},
+        **{f"source_{i}_valid": True for i in range(1, 9)},
+    }
+)
+
+
+class Unit:
+    """A HAL unit as set up by the integration, against a simulator."""
+
+    def __init__(self, hass, simulator, hal, scheduler, coordinator):
+        """Initialize the unit."""
+        self.hass = hass
+        self.simulator = simulator
+        self.hal = hal
+        self.scheduler = scheduler
+        self.coordinator = coordinator
+
+
+@contextlib.asynccontextmanager
+async def async_unit(zones=("1", "2", "3"), legacy=False, simulator_zones=None):
+    """Run a unit in a bare Home Assistant core, without config entries.
+
+    zones are the zones of the unit, and simulator_zones those fitted in the
+    simulator (all six by default). The zones are neither read nor given a
+    state; the tests set both up.
+    """
+    simulator = HALSimulator(latency=0, zones=simulator_zones)
+    await simulator.async_start()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        hal = create_client(
+            hass, "127.0.0.1", simulator.port, name=HAL_NAME, legacy=legacy
+        )
+        hal.set_select_interval(0.5)
+        assert await hal.async_connect()
+        scheduler = HALCommandScheduler(hal, HAL_NAME)
+        coordinator = HALDataUpdateCoordinator(
+            hass, hal, scheduler, HAL_NAME, list(zones), push=False
+        )
+        try:
+            yield Unit(hass, simulator, hal, scheduler, coordinator)
+        finally:
+            await scheduler.async_shutdown(0)
+            await coordinator.async_shutdown()
+            await hal.async_disconnect()
+            await hass.async_stop(force=True)
+            await simulator.async_stop()
+
+
+def zone_device(unit, zone_id, optimistic=False):
+    """Return the media player of a zone, recording the states it writes.
+
+    The written states are kept, as ZoneState, in the writes attribute.
+    """
+    device = HALZoneDevice(
+        unit.hass,
+        unit.scheduler,
+        unit.coordinator,
+        HAL_NAME,
+        zone_id,
+        f"Zone {zone_id}",
+        SOURCE_MAP,
+        optimistic=optimistic,
+    )
+    device.hass = unit.hass
+    device.entity_id = f"media_player.test_zone_{zone_id}"
+    device.writes = []
+    write_ha_state = device.async_write_ha_state
+
+    def recorded():
+        device.writes.append(device._zone_state)
+        write_ha_state()
+
+    device.async_write_ha_state = recorded
+    unit.coordinator.async_add_listener(device._handle_coordinator_update)
+    return device
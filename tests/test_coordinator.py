@@ -0,0 +1,166 @@
+"""Tests for the data update coordinator of a HAL CA1006 unit."""
+import asyncio
+
+import pytest
+
+from hal.const import (
+    HAL_ATTR_POWER,
+    HAL_BURST_POLLS,
+    HAL_BURST_SCAN_INTERVAL,
+    HAL_IDLE_SCAN_INTERVAL,
+    HAL_IDLE_TIMEOUT,
+    HAL_MAX_POLL_FAILURES,
+    HAL_MUTED,
+    HAL_NOT_MUTED,
+    HAL_OFF,
+    HAL_ON,
+    HAL_SCAN_INTERVAL,
+)
+from hal.models import ZoneState
+
+from common import async_unit
+
+RESTORED = ZoneState(power=True, source=2, volume=0.5, muted=False, restored=True)
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_restored_zone_command_before_first_poll(legacy):
+    """A command to a zone not read since a restart keeps its restored state."""
+
+    async def run():
+        async with async_unit(legacy=legacy) as unit:
+            coordinator = unit.coordinator
+            coordinator.data = {"1": RESTORED}
+            applied = await unit.scheduler.async_command("1", HAL_ATTR_POWER, HAL_OFF)
+            assert applied == HAL_OFF
+            coordinator.async_update_zone("1")
+            # Not mixed with the commanded power until the zone has been read
+            assert coordinator.data["1"] is RESTORED
+
+            await coordinator.async_refresh_all()
+            assert coordinator.data["1"] == ZoneState(
+                power=False, source=1, volume=0.25, muted=False
+            )
+
+    asyncio.run(run())
+
+
+def test_set_zones_sends_only_given_attributes():
+    """Attributes left out are not sent, so nothing is overwritten."""
+
+    async def run():
+        async with async_unit() as unit:
+            unit.simulator.set_zone(1, volume=20)
+            await unit.coordinator.async_refresh_all()
+            unit.simulator.commands.clear()
+
+            await unit.coordinator.async_set_zones(["1", "2"], muted=True)
+            assert unit.simulator.commands["MU"] == 2
+            assert unit.simulator.commands["SE"] == 0
+            assert unit.simulator.zones[1].volume == "20"
+            assert unit.coordinator.data["1"].muted
+
+            unit.simulator.commands.clear()
+            await unit.coordinator.async_set_zones(["1"])
+            assert not unit.simulator.commands
+
+    asyncio.run(run())
+
+
+def test_restore_sends_only_what_differs():
+    """Restoring sends nothing, one command, or one node status per zone."""
+
+    async def run():
+        async with async_unit() as unit:
+            simulator = unit.simulator
+            coordinator = unit.coordinator
+            simulator.set_zone(1, power=HAL_ON, source=2, volume=20)
+            simulator.set_zone(2, power=HAL_ON, source=3, volume=11, mute=HAL_MUTED)
+            await coordinator.async_refresh_all()
+            snapshot = dict(coordinator.data)
+
+            simulator.commands.clear()
+            assert await coordinator.async_restore(snapshot) == []
+            assert not simulator.commands
+
+            simulator.set_zone(1, volume=5)
+            simulator.set_zone(2, power=HAL_OFF, source=1, mute=HAL_NOT_MUTED)
+            await coordinator.async_refresh_all()
+            simulator.commands.clear()
+            assert sorted(await coordinator.async_restore(snapshot)) == ["1", "2"]
+            assert simulator.commands == {"VA": 1, "SE": 1}
+            # A volume read from the HAL is restored to the same step
+            assert (simulator.zones[1].volume, simulator.zones[2].volume) == (
+                "20",
+                "11",
+            )
+
+            await coordinator.async_refresh_all()
+            assert coordinator.data == snapshot
+
+    asyncio.run(run())
+
+
+def test_poll_interval_follows_activity():
+    """Changed zones are polled fast, then on or active ones at the scan interval."""
+
+    async def run():
+        async with async_unit() as unit:
+            coordinator = unit.coordinator
+            await coordinator.async_refresh_all()
+            off = coordinator.data["1"]
+            on = ZoneState(power=True, source=1, volume=0.25, muted=False)
+
+            coordinator.async_update_zone("1")
+            for _ in range(HAL_BURST_POLLS):
+                assert coordinator._zone_interval("1", off) == HAL_BURST_SCAN_INTERVAL
+            assert coordinator._zone_interval("1", off) == HAL_SCAN_INTERVAL
+            assert coordinator._zone_interval("1", on) == HAL_SCAN_INTERVAL
+            assert coordinator._zone_interval("4", None) == HAL_SCAN_INTERVAL
+
+            idle_since = unit.hass.loop.time() - HAL_IDLE_TIMEOUT - 1
+            coordinator._last_active["1"] = idle_since
+            assert coordinator._zone_interval("1", off) == HAL_IDLE_SCAN_INTERVAL
+            assert coordinator._zone_interval("1", on) == HAL_SCAN_INTERVAL
+
+    asyncio.run(run())
+
+
+def test_unreadable_zone_does_not_fail_the_update():
+    """A zone that cannot be read is retried without failing the others."""
+
+    async def run():
+        async with async_unit(zones=("1", "2"), simulator_zones=[1]) as unit:
+            coordinator = unit.coordinator
+            await coordinator.async_refresh_all()
+            assert coordinator.last_update_success
+            assert list(coordinator.data) == ["1"]
+            retry_in = coordinator._next_poll["2"] - unit.hass.loop.time()
+            assert HAL_SCAN_INTERVAL - 1 < retry_in <= HAL_SCAN_INTERVAL
+
+    asyncio.run(run())
+
+
+def test_update_fails_after_repeated_failed_polls():
+    """Known states are kept until HAL_MAX_POLL_FAILURES polls read nothing."""
+
+    async def run():
+        async with async_unit(zones=("1",)) as unit:
+            coordinator = unit.coordinator
+            await coordinator.async_refresh_all()
+            known = coordinator.data
+
+            unit.simulator.drop_rate = 1.0
+            for _ in range(HAL_MAX_POLL_FAILURES - 1):
+                await coordinator.async_refresh_all()
+                assert coordinator.last_update_success
+                assert coordinator.data == known
+            await coordinator.async_refresh_all()
+            assert not coordinator.last_update_success
+
+            # Once failed, every zone is polled on the next tick
+            unit.simulator.drop_rate = 0.0
+            await coordinator.async_refresh()
+            assert coordinator.last_update_success
+
+    asyncio.run(run())
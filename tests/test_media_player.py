@@ -0,0 +1,88 @@
+"""Tests for the zone media players of a HAL CA1006 unit."""
+import asyncio
+
+from hal.models import ZoneState
+
+from common import async_unit, zone_device
+
+
+def test_optimistic_volume_written_before_confirmed():
+    """The expected volume is shown at once, and kept once the HAL confirms it."""
+
+    async def run():
+        async with async_unit() as unit:
+            await unit.coordinator.async_refresh_all()
+            device = zone_device(unit, "1", optimistic=True)
+            unit.simulator.latency = 0.05
+
+            command = asyncio.create_task(device.async_set_volume_level(0.5))
+            await asyncio.sleep(0.01)
+            assert device.volume_level == 0.5
+            assert unit.simulator.zones[1].volume == "08"
+
+            await command
+            assert unit.simulator.zones[1].volume == "16"
+            assert device.volume_level == 0.5
+            assert [state.volume for state in device.writes] == [0.5]
+
+    asyncio.run(run())
+
+
+def test_optimistic_state_rolled_back_when_not_confirmed():
+    """The last state read from the HAL is shown again if it disagrees."""
+
+    async def run():
+        async with async_unit() as unit:
+            await unit.coordinator.async_refresh_all()
+            device = zone_device(unit, "1", optimistic=True)
+            before = unit.coordinator.data["1"]
+
+            unit.simulator.drop_rate = 1.0
+            await device.async_mute_volume(True)
+            assert [state.muted for state in device.writes] == [True, False]
+            assert device.is_volume_muted is False
+            assert unit.coordinator.data["1"] == before
+
+    asyncio.run(run())
+
+
+def test_optimistic_state_kept_for_restored_zone():
+    """A restored zone keeps the expected state until it has been read."""
+
+    async def run():
+        async with async_unit() as unit:
+            restored = ZoneState(
+                power=False, source=1, volume=0.25, muted=False, restored=True
+            )
+            unit.coordinator.data = {"1": restored}
+            device = zone_device(unit, "1", optimistic=True)
+
+            # The read back is dropped, so the zone is still not read
+            unit.simulator.drop_rate = 1.0
+            await device.async_mute_volume(True)
+            assert device.is_volume_muted is True
+            assert unit.coordinator.data["1"] is restored
+
+    asyncio.run(run())
+
+
+def test_command_to_restored_zone_without_optimistic_mode():
+    """Without optimistic mode, a restored zone shows its state until read."""
+
+    async def run():
+        async with async_unit() as unit:
+            restored = ZoneState(
+                power=False, source=1, volume=0.25, muted=False, restored=True
+            )
+            unit.coordinator.data = {"1": restored}
+            device = zone_device(unit, "1")
+
+            await device.async_turn_on()
+            assert unit.simulator.zones[1].power == "01"
+            assert device.extra_state_attributes == {"restored": True}
+
+            await unit.coordinator.async_refresh_all()
+            assert device.state == "on"
+            assert not device.extra_state_attributes
+
+    asyncio.run(run())
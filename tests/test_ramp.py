@@ -0,0 +1,72 @@
+"""Tests for the volume ramps of a HAL CA1006 unit."""
+import asyncio
+
+import pytest
+
+from hal.client import HAL_MAX_VOL, volume_step
+from hal.const import HAL_ATTR_VOLUME
+from hal.ramp import RAMP_CURVES, RAMP_EASE_IN, RAMP_EASE_OUT, RAMP_LINEAR, ramp_steps
+
+from common import async_unit
+
+
+def test_linear_ramp_sends_every_step_once():
+    """A full ramp sends each HAL step once, evenly spaced, ending at duration."""
+    steps = ramp_steps(0, 100, 3.2)
+    assert len(steps) == HAL_MAX_VOL
+    for index, (offset, volume) in enumerate(steps, start=1):
+        assert offset == pytest.approx(index * 0.1)
+        # The volume sent sets the HAL to the step, and is reported as it
+        assert volume * HAL_MAX_VOL // 100 == index
+        assert volume_step(index * 100 // HAL_MAX_VOL) == index
+
+
+def test_ramp_down_starts_from_reported_volume():
+    """A ramp down starts at the step below the one the HAL reports."""
+    steps = ramp_steps(62, 25, 1.0)
+    assert volume_step(62) == 20
+    assert [volume * HAL_MAX_VOL // 100 for _, volume in steps] == list(
+        range(19, 7, -1)
+    )
+    assert steps[-1][0] == pytest.approx(1.0)
+
+
+def test_ramp_within_one_step_is_empty():
+    """Nothing is sent when the target is the current step."""
+    assert ramp_steps(50, 51, 1.0) == []
+
+
+@pytest.mark.parametrize("curve", list(RAMP_CURVES))
+def test_curves_end_at_duration(curve):
+    """Every curve is monotonic and sends its last step at the duration."""
+    offsets = [offset for offset, _ in ramp_steps(0, 100, 2.0, curve)]
+    assert offsets == sorted(offsets)
+    assert offsets[-1] == pytest.approx(2.0)
+
+
+def test_ease_curves_bend_the_ramp():
+    """Ease in sends the first steps later than linear, ease out sooner."""
+    linear = ramp_steps(0, 100, 2.0, RAMP_LINEAR)[0][0]
+    assert ramp_steps(0, 100, 2.0, RAMP_EASE_IN)[0][0] > linear
+    assert ramp_steps(0, 100, 2.0, RAMP_EASE_OUT)[0][0] < linear
+
+
+def test_ramp_reaches_target_and_is_cancelled_by_a_command():
+    """A ramp ends at its target, unless a newer volume command cancels it."""
+
+    async def run():
+        async with async_unit() as unit:
+            scheduler = unit.scheduler
+            assert await scheduler.async_ramp_volume("1", 25, 50, 0.2, RAMP_LINEAR)
+            assert unit.simulator.zones[1].volume == "16"
+
+            ramp = asyncio.create_task(
+                scheduler.async_ramp_volume("1", 50, 100, 2.0, RAMP_LINEAR)
+            )
+            await asyncio.sleep(0.2)
+            assert await scheduler.async_command("1", HAL_ATTR_VOLUME, 10) == 10
+            assert not await ramp
+            await asyncio.sleep(0.2)
+            assert unit.simulator.zones[1].volume == "03"
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+"""Tests for the command scheduler of a HAL CA1006 unit."""
+import asyncio
+
+from hal.const import (
+    HAL_ATTR_POWER,
+    HAL_ATTR_VOLUME,
+    HAL_MUTED,
+    HAL_NOT_MUTED,
+    HAL_ON,
+)
+from hal.scheduler import HALCommandScheduler
+from hal.stats import HALStats
+
+
+class FakeHAL:
+    """Record the commands sent, holding them until the gate is opened."""
+
+    def __init__(self):
+        """Initialize the fake client."""
+        self.stats = HALStats()
+        self.gate = asyncio.Event()
+        self.sent = []
+
+    def is_connected(self):
+        """Return True; the fake is always connected."""
+        return True
+
+    async def _send(self, *command):
+        await self.gate.wait()
+        self.sent.append(command)
+        return True
+
+    async def async_set_power(self, zone, power):
+        """Record a power command."""
+        return await self._send("power", zone, power)
+
+    async def async_set_volume(self, zone, volume):
+        """Record a volume command."""
+        return await self._send("volume", zone, volume)
+
+    async def async_set_node_status(self, zone, power, source, volume, mute):
+        """Record a node status command."""
+        return await self._send("status", zone, power, source, volume, mute)
+
+
+async def _run(*submits):
+    """Queue the commands behind one in flight, then send them all."""
+    hal = FakeHAL()
+    scheduler = HALCommandScheduler(hal)
+    blocker = asyncio.create_task(scheduler.async_command("6", HAL_ATTR_POWER, HAL_ON))
+    await asyncio.sleep(0)
+    tasks = []
+    for submit in submits:
+        tasks.append(asyncio.create_task(submit(scheduler)))
+        await asyncio.sleep(0)
+    hal.gate.set()
+    await blocker
+    results = await asyncio.gather(*tasks)
+    return hal.sent[1:], results
+
+
+def test_volume_after_node_status_wins():
+    """A volume queued after a node status is merged into it."""
+    sent, results = asyncio.run(
+        _run(
+            lambda s: s.async_command("1", HAL_ATTR_VOLUME, 20),
+            lambda s: s.async_set_zone("1", HAL_ON, 2, 50, HAL_NOT_MUTED),
+            lambda s: s.async_command("1", HAL_ATTR_VOLUME, 80),
+        )
+    )
+    assert sent == [("status", "1", HAL_ON, 2, 80, HAL_NOT_MUTED)]
+    assert results == [80, (HAL_ON, 2, 80, HAL_NOT_MUTED), 80]
+
+
+def test_node_status_replaces_queued_attributes():
+    """A node status takes over the commands queued for its zone only."""
+    sent, results = asyncio.run(
+        _run(
+            lambda s: s.async_command("1", HAL_ATTR_VOLUME, 20),
+            lambda s: s.async_command("2", HAL_ATTR_VOLUME, 30),
+            lambda s: s.async_set_zone("1", HAL_ON, 2, 50, HAL_MUTED),
+        )
+    )
+    assert sent == [
+        ("volume", "2", 30),
+        ("status", "1", HAL_ON, 2, 50, HAL_MUTED),
+    ]
+    assert results == [50, 30, (HAL_ON, 2, 50, HAL_MUTED)]
@@ -0,0 +1,59 @@
+"""Tests for the zone state of a HAL CA1006 unit kept across restarts."""
+import asyncio
+import tempfile
+
+from homeassistant.const import EVENT_HOMEASSISTANT_FINAL_WRITE
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from hal.const import STORAGE_KEY, STORAGE_VERSION
+from hal.models import ZoneState
+from hal.store import HALStateStore
+
+ENTRY_ID = "entry"
+
+
+async def _async_restart(config_dir, data):
+    """Save the zone state, stop, and load it again in a new core."""
+    hass = HomeAssistant(config_dir)
+    HALStateStore(hass, ENTRY_ID).async_save(data)
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_FINAL_WRITE)
+    await hass.async_stop(force=True)
+
+    hass = HomeAssistant(config_dir)
+    restored = await HALStateStore(hass, ENTRY_ID).async_load(["1", "2", "3"])
+    await hass.async_stop(force=True)
+    return restored
+
+
+def test_state_restored_after_restart():
+    """Saved zones come back flagged as restored, and only the valid ones."""
+    zone = ZoneState(power=True, source=3, volume=0.5, muted=True)
+    data = {"1": zone, "4": zone}
+    with tempfile.TemporaryDirectory() as config_dir:
+        restored = asyncio.run(_async_restart(config_dir, data))
+    assert restored == {
+        "1": ZoneState(power=True, source=3, volume=0.5, muted=True, restored=True)
+    }
+
+
+def test_unusable_saved_state_left_out():
+    """A zone saved with missing or unknown fields is not restored."""
+
+    async def run(config_dir):
+        hass = HomeAssistant(config_dir)
+        await Store(hass, STORAGE_VERSION, STORAGE_KEY.format(ENTRY_ID)).async_save(
+            {
+                "1": {"power": True, "source": 1, "volume": 0.25, "muted": False},
+                "2": {"power": True, "source": 1},
+                "3": {"power": True, "source": 1, "volume": 0.25, "loud": True},
+            }
+        )
+        restored = await HALStateStore(hass, ENTRY_ID).async_load(["1", "2", "3"])
+        await hass.async_stop(force=True)
+        return restored
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        restored = asyncio.run(run(config_dir))
+    assert list(restored) == ["1"]
+    assert restored["1"].restored
@@ -0,0 +1,354 @@
+"""Benchmarks of the hal integration against a simulated HAL CA1006.
+
+Runs the integration's client, scheduler, coordinator and media player
+entities inside a bare Home Assistant core, against tools/hal_simulator.py
+in the same event loop, and measures:
+
+  poll_cycle       time to refresh 1 to 6 zones in one coordinator cycle
+  command_latency  end-to-end time of async_set_volume_level,
+                   async_select_source and async_turn_on on a zone entity
+  slider_storm     a burst of volume changes, as sent while dragging a slider
+  executor         share of the wall time executor threads spend on the HAL
+  state_writes     state writes per second with zones changed from keypads
+
+Results are printed as JSON, or written to --output, so that runs on
+different commits can be compared. Run from the repository root with Home
+Assistant and halca1006 installed:
+
+    python tools/hal_benchmark.py --latency 0.03 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from hal.client import create_client  # noqa: E402
+from hal.const import HAL_ZONES  # noqa: E402
+from hal.coordinator import HALDataUpdateCoordinator  # noqa: E402
+from hal.media_player import HALZoneDevice  # noqa: E402
+from hal.models import SourceMap  # noqa: E402
+from hal.scheduler import HALCommandScheduler  # noqa: E402
+
+from hal_simulator import HALSimulator  # noqa: E402
+
+HAL_NAME = "Benchmark"
+SOURCES = {i: f"Source {i}" for i in range(1, 9)}
+SOURCE_MAP = SourceMap.from_config(
+    {
+        **{f"source_{i}": name for i, name in SOURCES.items()},
+        **{f"source_{i}_valid": True for i in SOURCES},
+    }
+)
+
+
+def _stats(samples):
+    """Summarize timings in seconds as milliseconds."""
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+def _git_revision():
+    """Return the commit being benchmarked, if known."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ExecutorMeter:
+    """Measure the time executor jobs submitted through hass take."""
+
+    def __init__(self, hass):
+        """Wrap hass.async_add_executor_job."""
+        self.busy = 0.0
+        self.jobs = 0
+        add_executor_job = hass.async_add_executor_job
+
+        def timed(target, *args):
+            def run():
+                start = time.perf_counter()
+                try:
+                    return target(*args)
+                finally:
+                    self.busy += time.perf_counter() - start
+                    self.jobs += 1
+
+            return add_executor_job(run)
+
+        hass.async_add_executor_job = timed
+
+
+class Unit:
+    """A HAL unit as set up by the integration, without config entries."""
+
+    def __init__(self, hass, port, args, zones, push=False):
+        """Create the client, scheduler, coordinator and zone entities."""
+        self.hass = hass
+        self.hal = create_client(
+            hass, "127.0.0.1", port, name=HAL_NAME, legacy=args.legacy
+        )
+        self.hal.set_select_interval(args.select_interval)
+        if args.adaptive:
+            self.hal.set_adaptive_interval(args.min_interval, args.max_interval)
+        self.scheduler = HALCommandScheduler(self.hal, HAL_NAME)
+        self.zones = zones
+        self.push = push and not args.legacy
+        self.coordinator = None
+        self.devices = []
+        self.state_writes = 0
+
+    async def async_start(self):
+        """Connect, refresh once and create the zone entities."""
+        if not await self.hal.async_connect():
+            raise RuntimeError("Unable to connect to the simulator")
+        self.coordinator = HALDataUpdateCoordinator(
+            self.hass, self.hal, self.scheduler, HAL_NAME, self.zones, push=self.push
+        )
+        await self.coordinator.async_refresh()
+        for zone_id in self.zones:
+            device = HALZoneDevice(
+                self.hass,
+                self.scheduler,
+                self.coordinator,
+                HAL_NAME,
+                zone_id,
+                f"Zone {zone_id}",
+                SOURCE_MAP,
+            )
+            device.hass = self.hass
+            device.entity_id = f"media_player.benchmark_zone_{zone_id}"
+            write_ha_state = device.async_write_ha_state
+
+            def counted(write_ha_state=write_ha_state):
+                self.state_writes += 1
+                write_ha_state()
+
+            device.async_write_ha_state = counted
+            self.coordinator.async_add_listener(device._handle_coordinator_update)
+            self.devices.append(device)
+
+    async def async_stop(self):
+        """Stop the coordinator and disconnect."""
+        if self.coordinator is not None:
+            self.coordinator.async_stop_push()
+            await self.coordinator.async_shutdown()
+        await self.hal.async_disconnect()
+
+
+async def bench_poll_cycle(hass, simulator, args):
+    """Time full coordinator refresh cycles for 1 to 6 zones."""
+    results = {}
+    for count in range(1, HAL_ZONES + 1):
+        unit = Unit(hass, simulator.port, args, [str(z) for z in range(1, count + 1)])
+        await unit.async_start()
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            await unit.coordinator.async_refresh_all()
+            samples.append(time.perf_counter() - start)
+        await unit.async_stop()
+        results[str(count)] = _stats(samples)
+    return results
+
+
+async def bench_command_latency(hass, simulator, args):
+    """Time zone entity commands from the call until they are confirmed."""
+    unit = Unit(hass, simulator.port, args, ["1"])
+    await unit.async_start()
+    device = unit.devices[0]
+    commands = {
+        "async_set_volume_level": lambda i: device.async_set_volume_level(
+            (i % 10) / 10
+        ),
+        "async_select_source": lambda i: device.async_select_source(
+            SOURCES[i % len(SOURCES) + 1]
+        ),
+        "async_turn_on": lambda i: device.async_turn_on(),
+    }
+    results = {}
+    for name, command in commands.items():
+        samples = []
+        for i in range(args.iterations):
+            start = time.perf_counter()
+            await command(i)
+            samples.append(time.perf_counter() - start)
+        results[name] = _stats(samples)
+    await unit.async_stop()
+    return results
+
+
+async def bench_slider_storm(hass, simulator, args):
+    """Drag a volume slider: many volume changes in quick succession."""
+    unit = Unit(hass, simulator.port, args, ["1"])
+    await unit.async_start()
+    device = unit.devices[0]
+    sent_before = simulator.commands["VA"]
+    writes_before = unit.state_writes
+    start = time.perf_counter()
+    tasks = []
+    for i in range(args.storm_size):
+        tasks.append(
+            asyncio.create_task(device.async_set_volume_level(i / args.storm_size))
+        )
+        await asyncio.sleep(args.storm_spacing)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    result = {
+        "changes": args.storm_size,
+        "spacing_ms": args.storm_spacing * 1000,
+        "settle_ms": round(elapsed * 1000, 2),
+        "commands_sent": simulator.commands["VA"] - sent_before,
+        "state_writes": unit.state_writes - writes_before,
+        "final_volume": device.volume_level,
+    }
+    await unit.async_stop()
+    return result
+
+
+async def bench_executor(hass, simulator, args):
+    """Measure executor thread occupancy over a series of poll cycles."""
+    meter = ExecutorMeter(hass)
+    unit = Unit(hass, simulator.port, args, [str(z) for z in range(1, HAL_ZONES + 1)])
+    await unit.async_start()
+    busy_before, jobs_before = meter.busy, meter.jobs
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        await unit.coordinator.async_refresh_all()
+    elapsed = time.perf_counter() - start
+    await unit.async_stop()
+    return {
+        "wall_s": round(elapsed, 3),
+        "executor_busy_s": round(meter.busy - busy_before, 3),
+        "executor_jobs": meter.jobs - jobs_before,
+        "occupancy": round((meter.busy - busy_before) / elapsed, 3),
+    }
+
+
+async def bench_state_writes(hass, simulator, args):
+    """Count state writes while zones are changed from keypads."""
+    unit = Unit(
+        hass,
+        simulator.port,
+        args,
+        [str(z) for z in range(1, HAL_ZONES + 1)],
+        push=True,
+    )
+    await unit.async_start()
+    writes_before = unit.state_writes
+    changes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        zone = changes % HAL_ZONES + 1
+        simulator.set_zone(zone, power="01", volume=changes % 33)
+        changes += 1
+        await asyncio.sleep(args.keypad_spacing)
+    if not unit.push:
+        await unit.coordinator.async_refresh_all()
+        unit.coordinator.async_update_listeners()
+    await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    writes = unit.state_writes - writes_before
+    await unit.async_stop()
+    return {
+        "push": unit.push,
+        "keypad_changes": changes,
+        "state_writes": writes,
+        "writes_per_s": round(writes / elapsed, 1),
+    }
+
+
+BENCHMARKS = {
+    "poll_cycle": bench_poll_cycle,
+    "command_latency": bench_command_latency,
+    "slider_storm": bench_slider_storm,
+    "executor": bench_executor,
+    "state_writes": bench_state_writes,
+}
+
+
+async def async_main(args):
+    """Run the selected benchmarks and return the results."""
+    simulator = HALSimulator(latency=args.latency, jitter=args.jitter)
+    await simulator.async_start()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        results = {
+            "meta": {
+                "revision": _git_revision(),
+                "python": platform.python_version(),
+                "parameters": vars(args),
+            }
+        }
+        for name in args.benchmarks:
+            results[name] = await BENCHMARKS[name](hass, simulator, args)
+        await hass.async_stop(force=True)
+    await simulator.async_stop()
+    return results
+
+
+def main():
+    """Parse the command line and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)",
+    )
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--select-interval", type=float, default=0.5)
+    parser.add_argument(
+        "--adaptive", action=argparse.BooleanOptionalAction, default=True
+    )
+    parser.add_argument("--min-interval", type=float, default=0.05)
+    parser.add_argument("--max-interval", type=float, default=2.0)
+    parser.add_argument("--legacy", action="store_true", help="use HALProtocol")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--storm-size", type=int, default=50)
+    parser.add_argument("--storm-spacing", type=float, default=0.01)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--keypad-spacing", type=float, default=0.02)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    args.benchmarks = args.benchmarks or list(BENCHMARKS)
+    logging.basicConfig(level=logging.WARNING)
+    # The zone entities are not added through an entity platform
+    logging.getLogger("homeassistant.helpers.entity").setLevel(logging.ERROR)
+
+    results = asyncio.run(async_main(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
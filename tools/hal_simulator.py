@@ -0,0 +1,370 @@
+"""Simulator of a HAL CA1006 multi-zone amplifier.
+
+Serves the CA1006 protocol on a TCP port, so that the hal integration can be
+run, tested and benchmarked without an amplifier. The simulator has six zones
+and eight sources, and keeps the power, source, volume and mute state of each
+zone. Response latency, jitter, dropped responses and dropped connections can
+be configured to reproduce a slow or unreliable serial bridge.
+
+Run it with, for example:
+
+    python tools/hal_simulator.py --port 7000 --latency 0.03 --jitter 0.01
+
+and point the integration at localhost:7000. It can also be started from
+other scripts:
+
+    simulator = HALSimulator(latency=0.02)
+    await simulator.async_start()
+    ...
+    await simulator.async_stop()
+"""
+import argparse
+import asyncio
+from collections import Counter
+import logging
+import random
+
+_LOGGER = logging.getLogger("hal_simulator")
+
+HAL_ZONES = 6
+HAL_SOURCES = 8
+HAL_MAX_VOL = 32
+HAL_ON = "01"
+HAL_OFF = "00"
+HAL_EOL = b"\r"
+HAL_LINE_END = b"\n\r"
+HAL_VERSION = "1.23"
+
+HAL_RA_STATUS_HEADER = b"Status Source Volume Video Mute  !!!!!RA Status!!!!!   "
+
+# Responses sent before and after a command has been passed on to the zone
+HAL_RESPONSES = {
+    "MU": (b"MUTE SENDING - PLEASE WAIT", b"MUTE SEND COMPLETE"),
+    "PW": (b"PWR STATE SEND-PLEASE WAIT", b"POWER STATE SEND COMPLETE"),
+    "SS": (b"SOURCE SEND - PLEASE WAIT", b"SOURCE SEND COMPLETE"),
+    "VA": (b"VOLUME SEND - PLEASE WAIT", b"VOLUME SEND COMPLETE"),
+    "TO": (b"SYSTEM POWERSAVE EXECUTING", b"SYSTEM POWERSAVE EXECUTED"),
+}
+
+
+class Zone:
+    """The state of one simulated zone, as the raw strings the HAL reports."""
+
+    def __init__(self, power=HAL_OFF, source="01", volume="08", mute="00"):
+        """Initialize the zone."""
+        self.power = power
+        self.source = source
+        self.volume = volume
+        self.mute = mute
+
+    def ra_status(self):
+        """Return the zone status following the RA status header."""
+        return f"{self.power} {self.source} {self.volume} 00 {self.mute}".encode()
+
+    def status_frame(self, zone):
+        """Return the status frame announcing the state of the zone."""
+        return (
+            f"SE {zone} {self.power} {self.source} {self.volume} {self.mute}".encode()
+        )
+
+
+class HALSimulator:
+    """Serve the HAL CA1006 protocol for a simulated amplifier."""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.02,
+        jitter=0.0,
+        drop_rate=0.0,
+        disconnect_rate=0.0,
+        keypad_interval=None,
+        echo=True,
+        zones=None,
+    ):
+        """Initialize the simulator.
+
+        latency and jitter are in seconds; every response is delayed by the
+        latency plus a uniformly distributed random part of up to jitter.
+        drop_rate is the probability that a command is not answered, and
+        disconnect_rate the probability that the connection is dropped
+        instead of answering. If keypad_interval is set, a random zone is
+        changed every keypad_interval seconds, as if from a wall keypad, and
+        its status frame is pushed to all clients. zones lists the zones that
+        are fitted (all six by default); the others answer INVALID ADDRESS.
+        Port 0 picks a free port.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.disconnect_rate = disconnect_rate
+        self.keypad_interval = keypad_interval
+        self.echo = echo
+        self.zones = {z: Zone() for z in zones or range(1, HAL_ZONES + 1)}
+        self.commands = Counter()
+        self.connections = 0
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+        self._keypad_task = None
+
+    async def async_start(self):
+        """Start serving. Returns the port the simulator listens on."""
+        self._server = await asyncio.start_server(
+            self._async_handle_client, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.keypad_interval:
+            self._keypad_task = asyncio.get_running_loop().create_task(
+                self._async_keypad()
+            )
+        _LOGGER.info("Simulating a HAL CA1006 on %s:%s", self.host, self.port)
+        return self.port
+
+    async def async_stop(self):
+        """Stop serving and close all client connections."""
+        if self._keypad_task is not None:
+            self._keypad_task.cancel()
+            self._keypad_task = None
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            if self._handlers:
+                await asyncio.wait(list(self._handlers))
+            await self._server.wait_closed()
+            self._server = None
+
+    async def async_disconnect_clients(self):
+        """Drop all client connections, as if the serial bridge was reset."""
+        for writer in list(self._writers):
+            writer.close()
+
+    def set_zone(self, zone, power=None, source=None, volume=None, mute=None):
+        """Change a zone from outside the protocol and push its status frame.
+
+        Volume is given in raw HAL steps (0..32).
+        """
+        state = self.zones[zone]
+        if power is not None:
+            state.power = power
+        if source is not None:
+            state.source = f"{int(source):02d}"
+        if volume is not None:
+            state.volume = f"{int(volume):02d}"
+        if mute is not None:
+            state.mute = mute
+        frame = state.status_frame(zone) + HAL_LINE_END
+        for writer in list(self._writers):
+            writer.write(frame)
+
+    async def _async_keypad(self):
+        """Change a random zone every keypad interval."""
+        while True:
+            await asyncio.sleep(self.keypad_interval)
+            zone = random.choice(list(self.zones))
+            self.set_zone(
+                zone,
+                power=random.choice((HAL_ON, HAL_OFF)),
+                volume=random.randint(0, HAL_MAX_VOL),
+            )
+
+    async def _async_handle_client(self, reader, writer):
+        """Answer the commands of one client until it disconnects."""
+        self.connections += 1
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        echo = self.echo
+        peer = writer.get_extra_info("peername")
+        _LOGGER.debug("Client %s connected", peer)
+        buf = b""
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                buf += data
+                while HAL_EOL in buf:
+                    line, buf = buf.split(HAL_EOL, 1)
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if echo:
+                        writer.write(line + HAL_LINE_END)
+                    args = line.decode(errors="replace").split()
+                    self.commands[args[0]] += 1
+                    if random.random() < self.disconnect_rate:
+                        _LOGGER.debug("Dropping connection of %s", peer)
+                        return
+                    if args[0] in ("E0", "E1"):
+                        echo = args[0] == "E1"
+                    await asyncio.sleep(
+                        self.latency + random.uniform(0, self.jitter)
+                    )
+                    if random.random() < self.drop_rate:
+                        _LOGGER.debug("Dropping response to %s", line)
+                        continue
+                    await self._async_respond(writer, args)
+        except (ConnectionError, OSError) as err:
+            _LOGGER.debug("Connection error with %s: %s", peer, err)
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+            _LOGGER.debug("Client %s disconnected", peer)
+
+    async def _async_respond(self, writer, args):
+        """Apply a command and write the HAL's response to it."""
+        command = args[0]
+        lines = []
+        if command in ("E0", "E1"):
+            lines = [b""]
+        elif command == "VE":
+            lines = [f"AM6 VERSION {HAL_VERSION}".encode()]
+        elif command == "TO":
+            for state in self.zones.values():
+                state.power = HAL_OFF
+        elif command in ("SR", "MU", "PW", "SS", "VA", "SE"):
+            zone = self._zone(args)
+            if zone is None:
+                lines = [b"INVALID ADDRESS"]
+            else:
+                lines = self._zone_command(command, zone, args[2:])
+        else:
+            lines = [b"INVALID COMMAND"]
+
+        if command in HAL_RESPONSES and lines == []:
+            before, after = HAL_RESPONSES[command]
+            # The HAL confirms a command only once the zone has acknowledged it
+            writer.write(before + HAL_LINE_END)
+            await writer.drain()
+            await asyncio.sleep(self.latency / 2)
+            lines = [after]
+        writer.write(b"".join(line + HAL_LINE_END for line in lines))
+        await writer.drain()
+
+    def _zone(self, args):
+        """Return the zone addressed by a command, or None if invalid."""
+        if len(args) < 2 or not args[1].isdigit():
+            return None
+        zone = int(args[1])
+        return zone if zone in self.zones else None
+
+    def _zone_command(self, command, zone, values):
+        """Apply a command to a zone and return the lines to respond with.
+
+        An empty list stands for the command's usual two line response.
+        """
+        state = self.zones[zone]
+        try:
+            if command == "SR":
+                return [HAL_RA_STATUS_HEADER, state.ra_status()]
+            if command == "MU":
+                state.mute = f"{int(values[0]):02d}"
+            elif command == "PW":
+                state.power = f"{int(values[0]):02d}"
+            elif command == "SS":
+                state.source = self._source(values[0])
+            elif command == "VA":
+                state.volume = self._volume(values[0])
+            elif command == "SE":
+                power, source, volume, mute = values[:4]
+                state.power = f"{int(power):02d}"
+                state.source = self._source(source)
+                state.volume = self._volume(volume)
+                state.mute = f"{int(mute):02d}"
+                return [state.status_frame(zone)]
+        except (IndexError, ValueError):
+            return [b"INVALID PARAMETER"]
+        return []
+
+    @staticmethod
+    def _source(value):
+        """Validate a source number."""
+        source = int(value)
+        if not 1 <= source <= HAL_SOURCES:
+            raise ValueError(value)
+        return f"{source:02d}"
+
+    @staticmethod
+    def _volume(value):
+        """Validate a raw volume."""
+        volume = int(value)
+        if not 0 <= volume <= HAL_MAX_VOL:
+            raise ValueError(value)
+        return f"{volume:02d}"
+
+
+def main():
+    """Run the simulator until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="response latency in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="random extra latency in seconds"
+    )
+    parser.add_argument(
+        "--drop-rate",
+        type=float,
+        default=0.0,
+        help="probability of not answering a command",
+    )
+    parser.add_argument(
+        "--disconnect-rate",
+        type=float,
+        default=0.0,
+        help="probability of dropping the connection instead of answering",
+    )
+    parser.add_argument(
+        "--keypad-interval",
+        type=float,
+        default=None,
+        help="seconds between simulated keypad changes",
+    )
+    parser.add_argument(
+        "--zones",
+        type=int,
+        nargs="+",
+        choices=range(1, HAL_ZONES + 1),
+        help="zones that are fitted (default: all)",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="log connections and dropped responses"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        format="%(asctime)s %(message)s",
+        level=logging.DEBUG if args.debug else logging.INFO,
+    )
+
+    async def run():
+        simulator = HALSimulator(
+            host=args.host,
+            port=args.port,
+            latency=args.latency,
+            jitter=args.jitter,
+            drop_rate=args.drop_rate,
+            disconnect_rate=args.disconnect_rate,
+            keypad_interval=args.keypad_interval,
+            zones=args.zones,
+        )
+        await simulator.async_start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await simulator.async_stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()